@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+'Micro-benchmarks for hot paths.  Usage: PYTHONPATH=. dev/benchmark.py [benchmark ...] [-n NROWS]'
+
+import sys
+import time
+import random
+import argparse
+
+import visidata
+from visidata import Sheet, ColumnItem, ColumnExpr, LazyMapRow, anytype, vd, options
+from visidata.vdtui import getGlobals
+
+vd().execAsync = lambda func, *args, **kwargs: func(*args, **kwargs)  # time @asyncthread functions too
+
+benchmarks = {}  # [name] -> func(nrows)
+
+def benchmark(func):
+    benchmarks[func.__name__] = func
+    return func
+
+def timeit(desc, n, func, *args):
+    'Call func(*args) and print rate of n things per second.'
+    t0 = time.perf_counter()
+    func(*args)
+    dt = time.perf_counter() - t0
+    print('%-40s %12.0f/s  (%.3fs)' % (desc, n/dt if dt else 0, dt))
+    return dt
+
+def makeSheet(nrows, ncols=4):
+    'Sheet of string cells, like a freshly loaded tsv: text, int-like, float-like, and ncols-3 text columns.'
+    rnd = random.Random(0)
+    words = 'apple banana cherry durian elderberry fig grape'.split()
+    rows = [[rnd.choice(words), str(rnd.randint(0, 10000)), '%.3f' % rnd.random()] + [rnd.choice(words)*2]*(ncols-3)
+                for i in range(nrows)]
+    vs = Sheet('bench', rows=rows, columns=[
+            ColumnItem('text', 0, type=str),
+            ColumnItem('int', 1, type=int),
+            ColumnItem('float', 2, type=float),
+            ColumnItem('any', 3, type=anytype),
+        ] + [ColumnItem('any%s' % i, i, type=anytype) for i in range(4, ncols)])
+    vs.recalc()
+    return vs
+
+
+@benchmark
+def getcell(nrows):
+    'cells/s rendered by Column.getCell vs Column.getCellRenderer'
+    vs = makeSheet(nrows)
+    width = 20
+    for col in vs.columns:
+        def slow(col=col):
+            for r in vs.rows:
+                col.getCell(r, width)
+        def fast(col=col):
+            render = col.getCellRenderer(width)
+            for r in vs.rows:
+                render(r)
+        timeit('getCell %s' % col.name, nrows, slow)
+        timeit('getCellRenderer %s' % col.name, nrows, fast)
+
+
+@benchmark
+def clipstr(nrows):
+    'strings/s clipped by clipstr, uncached and cached'
+    from visidata.vdtui import clipstr, _clipcache
+    vs = makeSheet(nrows)
+    for col in vs.columns:
+        strs = [col.getDisplayValue(r) for r in vs.rows]
+        def clipall():
+            for s in strs:
+                clipstr(s, 10)
+        _clipcache.clear()
+        timeit('clipstr %s' % col.name, nrows, clipall)
+        timeit('clipstr %s (cached)' % col.name, nrows, clipall)
+
+
+@benchmark
+def materialize(nrows):
+    'typed values/s from Column.getTypedValue, before and after Column.materialize'
+    vs = makeSheet(nrows)
+    for col in vs.columns[1:3]:
+        def typedall(col=col):
+            for r in vs.rows:
+                col.getTypedValue(r)
+        timeit('getTypedValue %s' % col.name, nrows, typedall)
+        timeit('materialize %s' % col.name, nrows, col.materialize)
+        timeit('getTypedValue %s (materialized)' % col.name, nrows, typedall)
+
+
+@benchmark
+def sort(nrows):
+    'rows/s sorted by Sheet.orderBy'
+    vs = makeSheet(nrows)
+    timeit('orderBy int', nrows, vs.orderBy, vs.columns[1])
+    timeit('orderBy text,float', nrows, vs.orderBy, vs.columns[0], vs.columns[2])
+
+
+@benchmark
+def select(nrows):
+    'rows/s for bulk selection commands'
+    vs = makeSheet(nrows)
+    timeit('select all (gs)', nrows, vs.select, vs.rows)
+    timeit('toggle all (gt)', nrows, vs.toggle, vs.rows)
+    timeit('select half (zs)', nrows, vs.select, vs.rows[:nrows//2])
+    timeit('selectedRows', nrows, lambda: vs.selectedRows)
+    timeit('isSelected each row', nrows, lambda: [vs.isSelected(r) for r in vs.rows])
+    timeit('unselect all (gu)', nrows, vs.clearSelected)
+
+
+exprNcols = 400
+expr = 'int + len(any%s)' % (exprNcols-1)
+
+def evalLazyMapRow(vs, expr):
+    'func(row) evaluating expr like Sheet.evalexpr did before compileExpr'
+    code = compile(expr, '<expr>', 'eval')
+    return lambda r: eval(code, getGlobals(), LazyMapRow(vs, r))
+
+@benchmark
+def addcol_expr(nrows):
+    'rows/s computed by a new ColumnExpr (addcol-expr) on a 400-column sheet'
+    vs = makeSheet(nrows, exprNcols)
+    timeit('LazyMapRow %s' % expr, nrows, lambda f=evalLazyMapRow(vs, expr): [f(r) for r in vs.rows])
+    c = ColumnExpr('expr', expr)
+    vs.addColumn(c)
+    timeit('ColumnExpr %s' % expr, nrows, lambda: [c.getValue(r) for r in vs.rows])
+
+@benchmark
+def select_expr(nrows):
+    'rows/s selected by expr (select-expr) on a 400-column sheet'
+    vs = makeSheet(nrows, exprNcols)
+    selexpr = expr + ' > 5000'
+    timeit('LazyMapRow %s' % selexpr, nrows, lambda: vs.select(vs.gatherBy(evalLazyMapRow(vs, selexpr)), progress=False))
+    vs.clearSelected()
+    timeit('compileExpr %s' % selexpr, nrows, lambda: vs.select(vs.gatherBy(vs.compileExpr(selexpr)), progress=False))
+
+@benchmark
+def vectorize(nrows):
+    'rows/s for a numeric expression evaluated per row and all at once with numpy (options.expr_numpy)'
+    vs = makeSheet(nrows)
+    numexpr = 'int * float + log(float + 1)'
+    c = vs.addColumn(ColumnExpr('expr', numexpr))
+    for col in vs.columns[1:3]:
+        col.materialize()
+    for numpy in [False, True]:
+        options.expr_numpy = numpy
+        if numpy and not vs.vectorizeExpr(numexpr):  # also imports numpy before timing
+            print('numpy not installed')
+            break
+        c.materialize()
+        timeit('%s, expr_numpy=%s' % (numexpr, numpy), nrows, lambda: [c.getValue(r) for r in vs.rows] if not numpy else c.materialize())
+        vs.clearSelected()
+        timeit('select-expr, expr_numpy=%s' % numpy, nrows, lambda: vs.select(vs.gatherByExpr(numexpr + ' > 1000'), progress=False))
+
+@benchmark
+def search(nrows):
+    'rows/s searched by regex (select-col-regex), without and with options.search_index'
+    vs = makeSheet(nrows)
+    for index in [0, 1]:
+        options.search_index = index
+        for col in vs.columns[:2]:
+            searchcol = lambda pattern: list(vd().searchRegex(vs, regex=pattern, columns=col))
+            if index:
+                timeit('build index %s' % col.name, nrows, searchcol, 'x')
+            for pattern in ['cherry', 'an+a', '^1.*3$']:
+                timeit('search %s /%s/, search_index=%s' % (col.name, pattern, index), nrows, searchcol, pattern)
+
+@benchmark
+def equal(nrows):
+    'rows/s for select-equal-cell (,) and next-value (>), scanning vs the column hash index'
+    vs = makeSheet(nrows)
+    col = vs.columns[0]
+    value = col.getTypedValue(vs.rows[0])
+    timeit('scan select-equal-cell', nrows, lambda: list(vs.gatherBy(lambda r: col.getTypedValue(r) == value)))
+    timeit('select-equal-cell, building index', nrows, lambda: list(vs.gatherByValue(col, value)))
+    timeit('select-equal-cell, indexed', nrows, lambda: list(vs.gatherByValue(col, value)))
+    timeit('select-equal-row, building indexes', nrows, lambda: list(vs.gatherByRowValues(vs.rows[0], vs.columns)))
+    timeit('select-equal-row, indexed', nrows, lambda: list(vs.gatherByRowValues(vs.rows[0], vs.columns)))
+
+    vs.orderBy(col)
+    vs.moveToNextValue(col)  # build the raw value index
+    def nextValues():
+        vs.cursorRowIndex = 0
+        while vs.moveToNextValue(col):
+            pass
+    timeit('next-value through sorted column', nrows, nextValues)
+
+@benchmark
+def range_select(nrows):
+    'rows/s for select-range (z,) and go-value, scanning vs bisecting a sheet sorted by the column'
+    vs = makeSheet(nrows)
+    col = vs.columns[1]
+    rangeRows = lambda: list(vs.gatherByRange(col, 1000, 2000))
+    timeit('select-range 1000 <= int < 2000, unsorted', nrows, rangeRows)
+    vs.orderBy(col)
+    timeit('select-range 1000 <= int < 2000, sorted', nrows, rangeRows)
+    timeit('go-value 5000, sorted', nrows, vs.moveToValue, col, 5000)
+
+@benchmark
+def describe(nrows):
+    'rows/s described (describe-sheet), exactly and sketched, by threads and by worker processes'
+    from visidata import DescribeSheet
+    vs = makeSheet(nrows)
+    for sketch in [0, 1]:
+        options.describe_sketch = sketch
+        for workers in [0, 2, 4]:
+            options.describe_workers = workers
+            timeit('describe, describe_sketch=%s describe_workers=%s' % (sketch, workers), nrows, DescribeSheet('describe', source=[vs]).reload)
+
+@benchmark
+def aggregate(nrows):
+    'rows/s aggregated by sum, mean, median and q4 on 2 columns, by each aggregator separately and all in one pass'
+    from visidata import aggregators, GroupAggregator
+    vs = makeSheet(nrows)
+    colaggrs = [(c, a) for c in vs.columns[1:3] for name in 'sum mean median q4'.split() for a in (aggregators[name] if isinstance(aggregators[name], list) else [aggregators[name]])]
+    timeit('%d aggregators separately' % len(colaggrs), nrows, lambda: [a(c, vs.rows) for c, a in colaggrs])
+    timeit('%d aggregators in one pass' % len(colaggrs), nrows, GroupAggregator(colaggrs).aggregate, vs.rows)
+
+@benchmark
+def pivot(nrows):
+    'rows/s pivoted (pivot) by text, keyed by int, with sum and q4 of float, including computing all cells'
+    from visidata import SheetPivot, addAggregators
+    vs = makeSheet(nrows)
+    vs.setKeys([vs.columns[1]])
+    addAggregators([vs.columns[2]], ['sum', 'q4'])
+    def pivotAll():
+        pvs = SheetPivot(vs, [vs.columns[0]])
+        pvs.reload()
+        for c in pvs.columns:
+            for r in pvs.rows:
+                c.getValue(r)
+    timeit('pivot', nrows, pivotAll)
+
+@benchmark
+def freq(nrows):
+    'rows/s binned by freq-col (F) and freq-keys (gF) on two columns'
+    from visidata import SheetFreqTable
+    vs = makeSheet(nrows)
+    for col in vs.columns[:3]:
+        timeit('freq-col %s' % col.name, nrows, SheetFreqTable(vs, col).reload)
+    timeit('freq-keys text,any', nrows, SheetFreqTable(vs, vs.columns[0], vs.columns[3]).reload)
+
+@benchmark
+def histogram(nrows):
+    'rows/s binned by freq-col (F) on a float column, a bin per value vs options.histogram_bins'
+    from visidata import SheetFreqTable
+    vs = makeSheet(nrows)
+    col = vs.columns[2]
+    col.materialize()
+    for nbins, evenrows in [(0, False), (20, False), (20, True)]:
+        options.histogram_bins = nbins
+        options.histogram_even_interval = evenrows
+        timeit('freq-col, histogram_bins=%s even_interval=%s' % (nbins, evenrows), nrows, SheetFreqTable(vs, col).reload)
+
+@benchmark
+def join(nrows):
+    'rows/s joined (join-sheets) on int, of nrows rows with nrows/4 rows of another sheet, in memory and partitioned to temp files by options.join_max_mem'
+    from visidata import createJoinedSheet
+    vs = makeSheet(nrows)
+    vs2 = makeSheet(nrows//4)
+    for s in [vs, vs2]:
+        s.setKeys([s.columns[1]])
+    for maxmem in [0, 1]:
+        options.join_max_mem = maxmem
+        for jointype in ['inner', 'outer', 'full']:
+            timeit('join %s, join_max_mem=%s' % (jointype, maxmem), nrows, createJoinedSheet([vs, vs2], jointype).reload)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default all): ' + ' '.join(benchmarks))
+    parser.add_argument('-n', dest='nrows', type=int, default=100000, help='number of rows')
+    args = parser.parse_args()
+
+    for name in args.names or benchmarks:
+        print('--- %s: %s' % (name, benchmarks[name].__doc__))
+        benchmarks[name](args.nrows)
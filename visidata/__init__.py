@@ -18,10 +18,12 @@ from .search import *
 
 from .pyobj import *
 from .metasheets import *
+from .valueindex import *
 from .join import *
+from .sketches import *
 from .describe import *
-from .freqtbl import *
 from .aggregators import *
+from .freqtbl import *
 from .asyncthread import *
 from .pivot import *
 from .tidydata import *
@@ -34,6 +36,7 @@ from .motd import *
 from .transpose import *
 from .diff import *
 from .shell import *
+from .textindex import *
 from .movement import *
 from ._profile import *
 
@@ -67,8 +67,8 @@ class ThreadProfiler:
         if exc_val:
             self.thread.exception = exc_val
         else:
-            # remove very-short-lived async actions
-            if elapsed_s(self.thread) < min_thread_time_s:
+            # remove very-short-lived async actions, unless they returned a status to show
+            if elapsed_s(self.thread) < min_thread_time_s and self.thread.status is None:
                 vd().threads.remove(self.thread)
 
 class ProfileSheet(Sheet):
@@ -2,7 +2,7 @@
 
 import functools
 import datetime
-from visidata import options, theme, Sheet, TypedWrapper
+from visidata import options, theme, Sheet, TypedWrapper, materializedTypes
 
 from .vdtui import vdtype
 
@@ -16,11 +16,11 @@ theme('disp_date_fmt','%Y-%m-%d', 'default fmtstr to strftime for date values')
 
 Sheet.addCommand('z~', 'type-any', 'cursorCol.type = anytype'),
 Sheet.addCommand('~', 'type-string', 'cursorCol.type = str'),
-Sheet.addCommand('@', 'type-date', 'cursorCol.type = date'),
-Sheet.addCommand('#', 'type-int', 'cursorCol.type = int'),
+Sheet.addCommand('@', 'type-date', 'cursorCol.type = date; cursorCol.materialize()'),
+Sheet.addCommand('#', 'type-int', 'cursorCol.type = int; cursorCol.materialize()'),
 Sheet.addCommand('z#', 'type-len', 'cursorCol.type = len'),
-Sheet.addCommand('$', 'type-currency', 'cursorCol.type = currency'),
-Sheet.addCommand('%', 'type-float', 'cursorCol.type = float'),
+Sheet.addCommand('$', 'type-currency', 'cursorCol.type = currency; cursorCol.materialize()'),
+Sheet.addCommand('%', 'type-float', 'cursorCol.type = float; cursorCol.materialize()'),
 
 
 floatchars='+-0123456789.'
@@ -49,6 +49,10 @@ class date(datetime.datetime):
         t = r.timetuple()
         return super().__new__(cls, *t[:6], microsecond=r.microsecond, tzinfo=r.tzinfo)
 
+    def __reduce_ex__(self, protocol):
+        'pickle as datetime, since __new__ does not take the pickled bytes'
+        return date, (datetime.datetime(*(self.timetuple()[:6] + (self.microsecond, self.tzinfo))),)
+
     def __str__(self):
         return self.strftime(options.disp_date_fmt)
 
@@ -79,6 +83,9 @@ class datedelta(datetime.timedelta):
 vdtype(date, '@', '', formatter=lambda fmtstr,val: val.strftime(fmtstr or options.disp_date_fmt))
 vdtype(currency, '$', '{:,.02f}')
 
+materializedTypes[currency] = 'd'
+materializedTypes[date] = None  # list of date objects; parsing is the slow part
+
 # simple constants, for expressions like 'timestamp+15*minutes'
 years=365.25
 months=30.0
@@ -9,24 +9,160 @@ Sheet.addCommand('z+', 'show-aggregate', 'agg=chooseOne(aggregators); status(cur
 
 aggregators = collections.OrderedDict()
 
-def _defaggr(name, type, func):
-    'Define aggregator `name` that calls func(col, rows)'
-    func.type=type
-    func.__name__ = name
-    return func
+class Aggregator:
+    """Aggregator `name`, computed over the non-null typed values of a column in one pass:
+        state = init(col); state = accumulate(state, value, row) for each value; state = merge(state, other) to combine groups; finalize(state) -> aggregate.
+    If keepValues ('values' or 'sorted'), the state is instead the list of values (sorted for 'sorted'), kept once per column for all such aggregators.
+    If fromValues, it gives the state for a list of values at once, which may be quicker than accumulating them.
+    Calling it as agg(col, rows) aggregates col over rows."""
+    def __init__(self, name, type, init=None, accumulate=None, merge=None, finalize=None, keepValues=None, fromValues=None):
+        self.__name__ = name
+        self.type = type
+        self.init = init or (lambda col: [])
+        self.accumulate = accumulate or (lambda state, v, row: state.append(v) or state)
+        self.merge = merge or (lambda state, other: state + other)
+        self.finalize = finalize
+        self.keepValues = keepValues
+        self.fromValues = fromValues
 
-def aggregator(name, func, *args, type=None):
+    def __call__(self, col, rows):
+        return GroupAggregator([(col, self)]).aggregate(rows)[0]
+
+    def __str__(self):
+        return self.__name__
+
+
+class GroupAggregator:
+    'Aggregators on columns, as (col, aggregator) pairs, computed together over a group of rows, either row by row with the same protocol as Aggregator, or all at once by aggregate().  Each value is typed once per column; values kept by aggregators are kept (and sorted) once per column.'
+    def __init__(self, colaggrs):
+        self.colaggrs = list(colaggrs)
+        self.isNull = isNullFunc()
+        self.cols = []  # [(col, [(resultidx, aggregator)] streamed, [(resultidx, aggregator)] from kept values)]
+        for i, (col, aggr) in enumerate(self.colaggrs):
+            for c, streamed, kept in self.cols:
+                if c is col:
+                    break
+            else:
+                c, streamed, kept = col, [], []
+                self.cols.append((c, streamed, kept))
+            (kept if aggr.keepValues else streamed).append((i, aggr))
+
+    def init(self):
+        'Return state for a new group: for each column, [number of values, list of values or None, [state or exception for each streamed aggregator]].'
+        return [[0, [] if kept else None, [aggr.init(col) for i, aggr in streamed]] for col, streamed, kept in self.cols]
+
+    def accumulate(self, state, row):
+        for (col, streamed, kept), colstate in zip(self.cols, state):
+            try:
+                v = col.getTypedValue(row)
+                if self.isNull(v):
+                    continue
+            except Exception:
+                continue
+
+            colstate[0] += 1
+            if kept:
+                colstate[1].append(v)
+            aggrstates = colstate[2]
+            for j, (i, aggr) in enumerate(streamed):
+                s = aggrstates[j]
+                if not isinstance(s, Exception):
+                    try:
+                        aggrstates[j] = aggr.accumulate(s, v, row)
+                    except Exception as e:
+                        aggrstates[j] = e
+        return state
+
+    def merge(self, state, other):
+        for (col, streamed, kept), colstate, otherstate in zip(self.cols, state, other):
+            colstate[0] += otherstate[0]
+            if kept:
+                colstate[1].extend(otherstate[1])
+            aggrstates = colstate[2]
+            for j, (i, aggr) in enumerate(streamed):
+                a, b = aggrstates[j], otherstate[2][j]
+                if isinstance(a, Exception) or isinstance(b, Exception):
+                    aggrstates[j] = a if isinstance(a, Exception) else b
+                else:
+                    try:
+                        aggrstates[j] = aggr.merge(a, b)
+                    except Exception as e:
+                        aggrstates[j] = e
+        return state
+
+    def finalize(self, state):
+        'Return list of aggregates, in the order of colaggrs.  An aggregator that fails gives its exception, or None if there were no values.'
+        results = [None]*len(self.colaggrs)
+        for (col, streamed, kept), (n, values, aggrstates) in zip(self.cols, state):
+            def _finalize(aggr, s):
+                try:
+                    return aggr.finalize(s)
+                except Exception as e:
+                    return e if n else None
+
+            for (i, aggr), s in zip(streamed, aggrstates):
+                results[i] = s if isinstance(s, Exception) else _finalize(aggr, s)
+
+            if kept:
+                sortedValues = None
+                for i, aggr in kept:
+                    if aggr.keepValues == 'sorted':
+                        if sortedValues is None:
+                            try:
+                                sortedValues = sorted(values)
+                            except Exception as e:
+                                sortedValues = e
+                        results[i] = sortedValues if isinstance(sortedValues, Exception) else _finalize(aggr, sortedValues)
+                    else:
+                        results[i] = _finalize(aggr, values)
+        return results
+
+    def aggregate(self, rows):
+        'Return list of aggregates over rows, one column at a time.'
+        state = []
+        for col, streamed, kept in self.cols:
+            byRow = [aggr for i, aggr in streamed if not aggr.fromValues]
+            values = []
+            valueRows = []  # only for aggregators without fromValues
+            for r in Progress(rows, 'calculating'):
+                try:
+                    v = col.getTypedValue(r)
+                    if self.isNull(v):
+                        continue
+                except Exception:
+                    continue
+                values.append(v)
+                if byRow:
+                    valueRows.append(r)
+
+            aggrstates = []
+            for i, aggr in streamed:
+                try:
+                    if aggr.fromValues:
+                        s = aggr.fromValues(values)
+                    else:
+                        s = aggr.init(col)
+                        for v, r in zip(values, valueRows):
+                            s = aggr.accumulate(s, v, r)
+                except Exception as e:
+                    s = e
+                aggrstates.append(s)
+            state.append([len(values), values if kept else None, aggrstates])
+        return self.finalize(state)
+
+
+def aggregator(name, func, *args, type=None, keepValues='values'):
     'Define simple aggregator `name` that calls func(values)'
-    def _func(col, rows):  # wrap builtins so they can have a .type
-        vals = list(col.getValues(rows))
-        try:
-            return func(vals, *args)
-        except Exception as e:
-            if len(vals) == 0:
-                return None
-            return e
+    aggregators[name] = Aggregator(name, type, finalize=lambda vals: func(vals, *args), keepValues=keepValues)
 
-    aggregators[name] = _defaggr(name, type, _func)
+def reducer(name, func, initial, type=None, finalize=lambda state: state, fromValues=None):
+    'Define streaming aggregator `name` with state func(state, value), starting from initial.'
+    aggregators[name] = Aggregator(name, type,
+                                   init=lambda col: initial,
+                                   accumulate=lambda state, v, row: func(state, v),
+                                   merge=func,
+                                   finalize=finalize,
+                                   fromValues=fromValues)
 
 ## specific aggregator implementations
 
@@ -63,19 +199,45 @@ def _percentile(N, percent, key=lambda x:x):
 
 @functools.lru_cache(100)
 def percentile(pct):
-    return _defaggr('p%s'%pct, None, lambda col,rows,pct=pct: _percentile(sorted(col.getValues(rows)), pct/100))
+    return Aggregator('p%s'%pct, None, finalize=lambda vals,pct=pct: _percentile(vals, pct/100), keepValues='sorted')
 
 def quantiles(q):
     return [percentile(round(100*i/q)) for i in range(1, q)]
 
-aggregator('min', min)
-aggregator('max', max)
-aggregator('avg', mean, type=float)
-aggregator('mean', mean, type=float)
-aggregator('median', median)
-aggregator('sum', sum)
-aggregator('distinct', set, type=len)
-aggregator('count', lambda values: sum(1 for v in values), type=int)
+def _min(a, b):
+    'The lesser of a and b, or a if equal (like min()), or the other if one is None.'
+    return b if a is None or (b is not None and b < a) else a
+
+def _max(a, b):
+    'The greater of a and b, or a if equal (like max()), or the other if one is None.'
+    return b if a is None or (b is not None and a < b) else a
+
+def _meanAggregator(name):
+    return Aggregator(name, float,
+                      init=lambda col: (0, 0),  # (sum, count)
+                      accumulate=lambda state, v, row: (state[0]+v, state[1]+1),
+                      merge=lambda state, other: (state[0]+other[0], state[1]+other[1]),
+                      finalize=lambda state: float(state[0])/state[1] if state[1] else None,
+                      fromValues=lambda vals: (sum(vals), len(vals)))
+
+reducer('min', _min, None, fromValues=lambda vals: min(vals) if vals else None)
+reducer('max', _max, None, fromValues=lambda vals: max(vals) if vals else None)
+aggregators['avg'] = _meanAggregator('avg')
+aggregators['mean'] = _meanAggregator('mean')
+aggregator('median', lambda vals: vals[len(vals)//2], keepValues='sorted')
+reducer('sum', lambda a, b: a+b, 0, fromValues=sum)
+aggregators['distinct'] = Aggregator('distinct', len,
+                                     init=lambda col: set(),
+                                     accumulate=lambda state, v, row: state.add(v) or state,
+                                     merge=lambda state, other: state | other,
+                                     finalize=lambda state: state,
+                                     fromValues=set)
+aggregators['count'] = Aggregator('count', int,
+                                  init=lambda col: 0,
+                                  accumulate=lambda state, v, row: state+1,
+                                  merge=lambda state, other: state+other,
+                                  finalize=lambda state: state,
+                                  fromValues=len)
 
 aggregators['q3'] = quantiles(3)
 aggregators['q4'] = quantiles(4)
@@ -83,7 +245,11 @@ aggregators['q5'] = quantiles(5)
 aggregators['q10'] = quantiles(10)
 
 # returns keys of the row with the max value
-aggregators['keymax'] = _defaggr('keymax', anytype, lambda col, rows: col.sheet.rowkey(max(col.getValueRows(rows))[1]))
+aggregators['keymax'] = Aggregator('keymax', anytype,
+                                   init=lambda col: (col, None),
+                                   accumulate=lambda state, v, row: (state[0], _max(state[1], (v, row))),
+                                   merge=lambda state, other: (state[0], _max(state[1], other[1])),
+                                   finalize=lambda state: state[0].sheet.rowkey(state[1][1]))
 
 ColumnsSheet.addCommand('g+', 'aggregate-cols', 'addAggregators(selectedRows or source[0].nonKeyVisibleCols, chooseMany(aggregators.keys()))')
 
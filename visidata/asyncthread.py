@@ -37,6 +37,7 @@ class ThreadsSheet(Sheet):
         self.rows = vd().threads
 
 ThreadsSheet.addCommand('^C', 'cancel-thread', 'cancelThread(cursorRow)')
+options.set('draw_cache', False, ThreadsSheet)  # process_time keeps changing
 
 def elapsed_s(t):
     return (t.endTime or time.process_time())-t.startTime
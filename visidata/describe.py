@@ -1,8 +1,20 @@
-from statistics import mode, median, mean, stdev
+from statistics import mode, median, mean, stdev, StatisticsError
+from fractions import Fraction
+import array
+import collections
+import math
+import multiprocessing
+import pickle
+import sys
+import threading
 
 from visidata import *
 
 max_threads = 2
+describe_chunk_rows = 10000  # rows of values sent to a worker process at a time
+
+option('describe_sketch', 0, 'approximate statistics in one pass and bounded memory for columns of sheets with at least this many rows (0 to never)')
+option('describe_workers', 0, 'number of worker processes computing statistics for DescribeSheet (0 for threads in this process)')
 
 Sheet.addCommand('I', 'describe-sheet', 'vd.push(DescribeSheet(sheet.name+"_describe", source=[sheet]))')
 globalCommand('gI', 'describe-all', 'vd.push(DescribeSheet("describe_all", source=vd.sheets))')
@@ -17,6 +29,238 @@ def isError(col, row):
         return True
 
 
+class RowIndexes:
+    'Rows of sheet at the given rowidxs, as of when they were collected; compact compared to a list of rows.'
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.rows = sheet.rows
+        self.version = (id(sheet.rows), len(sheet.rows), sheet.epoch)
+        self.rowidxs = array.array('L')
+
+    def append(self, rowidx):
+        self.rowidxs.append(rowidx)
+
+    def extend(self, rowidxs):
+        self.rowidxs.extend(rowidxs)
+
+    def __len__(self):
+        return len(self.rowidxs)
+
+    def __iter__(self):
+        if self.version != (id(self.sheet.rows), len(self.sheet.rows), self.sheet.epoch):
+            fail('%s rows have changed; reload describe sheet' % self.sheet.name)
+        for i in self.rowidxs:
+            yield self.rows[i]
+
+
+def collectStats(srccol, stats, rows, start=0):
+    'Add the typed values of srccol in rows to stats.  Return arrays of rowidxs (counting from start) of errors and nulls.'
+    isNull = isNullFunc()
+    errors = array.array('L')
+    nulls = array.array('L')
+    for i, sr in enumerate(rows, start):
+        try:
+            v = srccol.getValue(sr)
+            if isNull(v):
+                nulls.append(i)
+                stats.addNull(v)
+            else:
+                stats.add(srccol.type(v))
+        except Exception as e:
+            errors.append(i)
+    return errors, nulls
+
+
+def meanError(v, e):
+    'Return the exception statistics.mean raises for v (or else e), so that every way of describing a column reports the same error.'
+    try:
+        mean([v])
+    except Exception as meanerr:
+        return meanerr
+    return e
+
+
+class SketchStats:
+    'Approximate statistics of the values of a column, in one pass and bounded memory; mergeable.'
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.distinct = DistinctCounter()
+        self.frequent = FrequentValues()
+        self.quantiles = QuantileSketch()
+        self.moments = Moments()
+        self.momentsError = None  # from values like dates without arithmetic
+
+    def addNull(self, v):
+        self.distinct.add(v)
+
+    def add(self, v):
+        self.frequent.add(v)
+        if self.numeric:
+            self.quantiles.add(v)
+            if not self.momentsError:
+                try:
+                    self.moments.add(v)
+                except Exception as e:
+                    self.momentsError = meanError(v, e)
+        self.distinct.add(v)
+
+    def merge(self, other):
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        self.quantiles.merge(other.quantiles)
+        self.moments.merge(other.moments)
+        self.momentsError = self.momentsError or other.momentsError
+
+    def momentsStat(self, func):
+        if self.momentsError:
+            raise self.momentsError
+        return func()
+
+    def finish(self, d):
+        'Set the statistics in describeData d.'
+        d['distinct'] = self.distinct
+        d['mode'] = wrapply(FrequentValues.mode, self.frequent)
+        if self.numeric:
+            d['min'] = wrapply(lambda q: q.min if q.n else min([]), self.quantiles)
+            d['max'] = wrapply(lambda q: q.max if q.n else max([]), self.quantiles)
+            d['median'] = wrapply(QuantileSketch.median, self.quantiles)
+            d['mean'] = wrapply(self.momentsStat, self.moments.mean)
+            d['stdev'] = wrapply(self.momentsStat, self.moments.stdev)
+
+
+class ExactStats:
+    'Counts of each distinct value of a column, and exact sums, from which the exact statistics follow; mergeable.'
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.counts = collections.Counter()  # [typed value] -> count, in order of first appearance (for mode)
+        self.nullvals = set()
+        self.sums = None  # (sum, sum of squares) as Fractions, or exception; by sum()
+
+    def addNull(self, v):
+        self.nullvals.add(v)
+
+    def add(self, v):
+        self.counts[v] += 1
+
+    def sum(self):
+        'Compute sums of the values so far, for mean and stdev.'
+        if not self.numeric:
+            return
+        try:
+            total = totalsq = 0
+            for v, n in self.counts.items():
+                x = Fraction(v)
+                total += x*n
+                totalsq += x*x*n
+            self.sums = (total, totalsq)
+        except Exception as e:
+            self.sums = meanError(v, e)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.nullvals |= other.nullvals
+        if isinstance(self.sums, Exception) or other.sums is None:
+            pass
+        elif isinstance(other.sums, Exception) or self.sums is None:
+            self.sums = other.sums
+        else:
+            self.sums = (self.sums[0]+other.sums[0], self.sums[1]+other.sums[1])
+
+    def mode(self):
+        'Like statistics.mode: the first of the most common values, or before Python 3.8, an error if more than one value is most common.'
+        if not self.counts:
+            raise StatisticsError('no mode for empty data')
+        (v, n), = self.counts.most_common(1)
+        if sys.version_info < (3, 8):
+            nmodes = sum(1 for c in self.counts.values() if c == n)
+            if nmodes > 1:
+                raise StatisticsError('no unique mode; found %d equally common values' % nmodes)
+        return v
+
+    def median(self):
+        'Like statistics.median, without expanding the counts.'
+        n = sum(self.counts.values())
+        if not n:
+            raise StatisticsError('no median for empty data')
+        lo = hi = None
+        cum = 0
+        for v in sorted(self.counts):
+            cum += self.counts[v]
+            if lo is None and cum > (n-1)//2:
+                lo = v
+            if cum > n//2:
+                hi = v
+                break
+        return hi if n % 2 else (lo+hi)/2
+
+    def mean(self):
+        if isinstance(self.sums, Exception):
+            raise self.sums
+        n = sum(self.counts.values())
+        if not n:
+            raise StatisticsError('mean requires at least one data point')
+        return float(self.sums[0]/n)
+
+    def stdev(self):
+        if isinstance(self.sums, Exception):
+            raise self.sums
+        n = sum(self.counts.values())
+        if n < 2:
+            raise StatisticsError('stdev requires at least two data points')
+        total, totalsq = self.sums
+        return math.sqrt((totalsq - total*total/n)/(n-1))
+
+    def finish(self, d):
+        'Set the statistics in describeData d.'
+        d['distinct'] = set(self.counts) | self.nullvals
+        d['mode'] = wrapply(ExactStats.mode, self)
+        if self.numeric:
+            d['min'] = wrapply(min, self.counts)
+            d['max'] = wrapply(max, self.counts)
+            d['median'] = wrapply(ExactStats.median, self)
+            d['mean'] = wrapply(ExactStats.mean, self)
+            d['stdev'] = wrapply(ExactStats.stdev, self)
+
+
+class GetValueError:
+    'Stands in for the raw value of a row whose getValue raised, in chunks sent to worker processes.'
+
+
+def valueChunks(srccol, rows, chunkrows, *args):
+    'Generate (start, type, raw values, *args) of srccol for each chunkrows of rows, with GetValueError for values that raise.'
+    for start in range(0, len(rows), chunkrows):
+        vals = []
+        for r in rows[start:start+chunkrows]:
+            try:
+                vals.append(srccol.getValue(r))
+            except Exception as e:
+                vals.append(GetValueError)
+        yield (start, srccol.type, vals) + args
+
+
+def describeChunk(chunk):
+    'In a worker process: return (Stats, errors, nulls, cpu seconds) for a chunk from valueChunks, with rowidxs counting from its start.'
+    start, coltype, vals, Stats, numeric, nullvals = chunk
+    t0 = time.process_time()
+    stats = Stats(numeric)
+    errors = array.array('L')
+    nulls = array.array('L')
+    for i, v in enumerate(vals, start):
+        try:
+            if v is GetValueError:
+                errors.append(i)
+            elif v in nullvals or isinstance(v, TypedWrapper):  # like isNullFunc, with the null_value of this process
+                nulls.append(i)
+                stats.addNull(v)
+            else:
+                stats.add(coltype(v))
+        except Exception as e:
+            errors.append(i)
+    if isinstance(stats, ExactStats):
+        stats.sum()
+    return stats, errors, nulls, time.process_time()-t0
+
+
 class DescribeColumn(Column):
     def __init__(self, name, **kwargs):
         super().__init__(name, getter=lambda col,srccol: col.sheet.describeData[srccol].get(col.expr, ''), expr=name, **kwargs)
@@ -47,6 +291,9 @@ class DescribeSheet(ColumnsSheet):
         self.rows = [c for c in self.rows if not c.hidden]
         self.describeData = { col: {} for col in self.rows }
 
+        if options.describe_workers:
+            return self.reloadWorkers(options.describe_workers)
+
         for srccol in Progress(self.rows, 'categorizing'):
             if not srccol.hidden:
                 self.reloadColumn(srccol)
@@ -54,30 +301,121 @@ class DescribeSheet(ColumnsSheet):
 
     @asyncthread
     def reloadColumn(self, srccol):
-            d = self.describeData[srccol]
-            isNull = isNullFunc()
+        t = threading.current_thread()
+        t.name = 'describe %s' % srccol.name
+        t0 = time.perf_counter()
+        if options.describe_sketch and len(srccol.sheet.rows) >= options.describe_sketch:
+            self.sketchColumn(srccol)
+        else:
+            self.calcColumn(srccol)
+        return '%d rows: %.2fs' % (len(srccol.sheet.rows), time.perf_counter()-t0)
 
-            vals = list()
-            d['errors'] = list()
-            d['nulls'] = list()
-            d['distinct'] = set()
+    def calcColumn(self, srccol):
+        d = self.describeData[srccol]
+        isNull = isNullFunc()
 
-            for sr in Progress(srccol.sheet.rows, 'calculating'):
-                try:
-                    v = srccol.getValue(sr)
-                    if isNull(v):
-                        d['nulls'].append(sr)
-                    else:
-                        v = srccol.type(v)
-                        vals.append(v)
-                    d['distinct'].add(v)
-                except Exception as e:
-                    d['errors'].append(sr)
+        vals = list()
+        d['errors'] = list()
+        d['nulls'] = list()
+        d['distinct'] = set()
+
+        for sr in Progress(srccol.sheet.rows, 'calculating'):
+            try:
+                v = srccol.getValue(sr)
+                if isNull(v):
+                    d['nulls'].append(sr)
+                else:
+                    v = srccol.type(v)
+                    vals.append(v)
+                d['distinct'].add(v)
+            except Exception as e:
+                d['errors'].append(sr)
+
+        d['mode'] = self.calcStatistic(d, mode, vals)
+        if isNumeric(srccol):
+            for func in [min, max, median, mean, stdev]:
+                d[func.__name__] = self.calcStatistic(d, func, vals)
+
+    def sketchColumn(self, srccol):
+        'Like calcColumn, in one pass and bounded memory: approximate distinct, mode and median, and row indexes of errors and nulls.'
+        d = self.describeData[srccol]
+        stats = SketchStats(isNumeric(srccol))
+        d['errors'], d['nulls'] = RowIndexes(srccol.sheet), RowIndexes(srccol.sheet)
+        errors, nulls = collectStats(srccol, stats, Progress(srccol.sheet.rows, 'calculating'))
+        d['errors'].extend(errors)
+        d['nulls'].extend(nulls)
+        stats.finish(d)
+
+    def reloadWorkers(self, nworkers):
+        'Compute statistics of all columns in nworkers worker processes, each column in chunks of rows.  Up to nworkers columns at a time have a thread here to get their values and merge the partial results.'
+        # spawned, not forked: a fork copies the locks held by curses and other threads
+        self.pool = multiprocessing.get_context('spawn').Pool(nworkers)
+        try:
+            threads = []
+            for srccol in Progress(self.rows, 'categorizing'):
+                threads = [t for t in threads if isinstance(t, threading.Thread) and t.is_alive()]  # not if execAsync is synchronous (--batch)
+                while len(threads) >= nworkers:  # keep only a few chunks of values of a few columns in memory
+                    threads[0].join(0.1)  # in short waits, so this thread can be canceled
+                    threads = [t for t in threads if t.is_alive()]
+                threads.append(self.reloadColumnWorkers(srccol))
 
-            d['mode'] = self.calcStatistic(d, mode, vals)
-            if isNumeric(srccol):
-                for func in [min, max, median, mean, stdev]:
-                    d[func.__name__] = self.calcStatistic(d, func, vals)
+            for t in threads:
+                if isinstance(t, threading.Thread):
+                    t.join()
+            self.pool.close()
+            self.pool.join()
+        finally:
+            self.pool.terminate()
+            self.pool = None
+
+    @asyncthread
+    def reloadColumnWorkers(self, srccol):
+        t = threading.current_thread()
+        t.name = 'describe %s' % srccol.name
+        t0 = time.perf_counter()
+
+        d = self.describeData[srccol]
+        nrows = len(srccol.sheet.rows)
+        Stats = SketchStats if options.describe_sketch and nrows >= options.describe_sketch else ExactStats
+        stats = Stats(isNumeric(srccol))
+        d['errors'], d['nulls'] = RowIndexes(srccol.sheet), RowIndexes(srccol.sheet)
+        try:
+            nchunks, cpu = self.mergeWorkerResults(srccol, stats, d)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:  # values or type cannot be sent
+            status('describing %s in this process (%s)' % (srccol.name, e))
+            if Stats is SketchStats:
+                self.sketchColumn(srccol)
+            else:
+                self.calcColumn(srccol)
+            return '%d rows: %.2fs' % (nrows, time.perf_counter()-t0)
+
+        stats.finish(d)
+        return '%d rows in %d chunks: %.2fs, %.2fs cpu in workers' % (nrows, nchunks, time.perf_counter()-t0, cpu)
+
+    def mergeWorkerResults(self, srccol, stats, d):
+        'Describe the values of srccol in the worker pool, merging the results into stats and the errors and nulls into d.  Return (number of chunks, cpu seconds taken in the workers).'
+        # separate from reloadColumnWorkers, whose frame is kept alive by the tracebacks of statistics errors;
+        # the results refer to the pool, which would then not be freed (with its semaphores)
+        rows = srccol.sheet.rows
+        nullvals = (None, options.null_value)
+        # columns cannot be sent to another process, so their raw values are gotten here, as the pool takes chunks
+        results = self.pool.imap(describeChunk, valueChunks(srccol, rows, describe_chunk_rows, type(stats), stats.numeric, nullvals))
+        nchunks = cpu = 0
+        with Progress(total=len(rows), gerund='calculating') as prog:
+            while True:
+                try:
+                    partial, errors, nulls, partialcpu = results.next(0.1)  # in short waits, so the thread can be canceled
+                except multiprocessing.TimeoutError:
+                    continue
+                except StopIteration:
+                    break
+                stats.merge(partial)
+                d['errors'].extend(errors)
+                d['nulls'].extend(nulls)
+                cpu += partialcpu
+                nchunks += 1
+                prog.addProgress(describe_chunk_rows)
+        return nchunks, cpu
 
     def calcStatistic(self, d, func, *args, **kwargs):
         r = wrapply(func, *args, **kwargs)
@@ -87,4 +425,4 @@ class DescribeSheet(ColumnsSheet):
 
 DescribeSheet.addCommand('zs', 'select-cell', 'cursorRow.sheet.select(cursorValue)')
 DescribeSheet.addCommand('zu', 'unselect-cell', 'cursorRow.sheet.unselect(cursorValue)')
-DescribeSheet.addCommand('z'+ENTER, 'dup-cell', 'isinstance(cursorValue, list) or error(cursorValue); vs=copy(cursorRow.sheet); vs.rows=cursorValue; vs.name+="_%s_%s"%(cursorRow.name,cursorCol.name); vd.push(vs)')
+DescribeSheet.addCommand('z'+ENTER, 'dup-cell', 'isinstance(cursorValue, (list, RowIndexes)) or error(cursorValue); vs=copy(cursorRow.sheet); vs.rows=list(cursorValue); vs.name+="_%s_%s"%(cursorRow.name,cursorCol.name); vd.push(vs)')
@@ -1,25 +1,166 @@
-from visidata import theme, globalCommand, Sheet, CellColorizer
+import bisect
+import weakref
+
+from visidata import theme, option, options, globalCommand, Sheet, CellColorizer, vd, Progress, status, fail
 
 theme('color_diff', 'red', 'color of values different from --diff source')
 theme('color_diff_add', 'yellow', 'color of rows/columns added to --diff source')
+option('diff_keys', False, 'align rows with --diff source by key columns (if both sheets have them) instead of by row number')
 
 globalCommand(None, 'setdiff-sheet', 'setDiffSheet(sheet)')
+Sheet.addCommand('z}', 'next-diff', 'moveToNextDiff(sheet) or fail("no more differing rows")')
+Sheet.addCommand('z{', 'prev-diff', 'moveToNextDiff(sheet, reverse=True) or fail("no previous differing rows")')
 
+ADDED = -1  # rowDiffs value for rows without a counterpart in the diff source
 
-def makeDiffColorizer(othersheet):
-    def colorizeDiffs(sheet, col, row, cellval):
-        if not row or not col:
-            return None
-        vcolidx = sheet.visibleCols.index(col)
-        rowidx = sheet.rows.index(row)
-        if vcolidx < len(othersheet.visibleCols) and rowidx < len(othersheet.rows):
-            otherval = othersheet.visibleCols[vcolidx].getDisplayValue(othersheet.rows[rowidx])
-            if cellval.display != otherval:
-                return 'color_diff'
+sheetDiffs = weakref.WeakKeyDictionary()  # [Sheet] -> SheetDiff against vd().diffSheet
+
+
+def diffVersion(sheet, othersheet):
+    'Anything the diff between sheet and othersheet depends on (cheap enough to check for every cell), besides which lists their .rows are.'
+    return (sheet.epoch, othersheet.epoch,
+            len(sheet.rows), len(othersheet.rows),
+            options.diff_keys)
+
+
+class SheetDiff:
+    'Differences between the rows of sheet and othersheet, computed once in the background.'
+    def __init__(self, sheet, othersheet):
+        self.sheet = sheet
+        self.othersheet = othersheet
+        self.version = diffVersion(sheet, othersheet)
+        self.rows = sheet.rows
+        self.otherrows = othersheet.rows
+        self.colbits = {}      # [Column] -> bit in rowDiffs masks
+        self.addedCols = set() # columns without a counterpart in othersheet
+        self.rowDiffs = {}     # [id(row)] -> bitmask of differing columns, or ADDED; rows absent are the same
+        self.diffRowIdxs = []  # sorted row indexes of rowDiffs, for next-diff/prev-diff
+        self.done = False
+        self.thread = vd().execAsync(self.computeDiffs, sheet=sheet)  # canceled along with sheet
+
+    def alignedRows(self):
+        'Generate (rowidx, row, otherrow) with otherrow None if row has no counterpart.'
+        sheet, othersheet = self.sheet, self.othersheet
+        if options.diff_keys and sheet.keyCols and othersheet.keyCols:
+            otherRows = {}  # [key] -> list of rows in othersheet with that key
+            for r in Progress(self.otherrows, 'indexing'):
+                otherRows.setdefault(displayKey(othersheet, r), []).append(r)
+
+            nseen = {}  # [key] -> number of rows in sheet with that key so far; duplicates pair up in order
+            for i, r in enumerate(Progress(self.rows, 'diffing')):
+                k = displayKey(sheet, r)
+                n = nseen.get(k, 0)
+                nseen[k] = n+1
+                others = otherRows.get(k, ())
+                yield i, r, others[n] if n < len(others) else None
         else:
-            return 'color_diff_add'
-    return colorizeDiffs
+            otherrows = self.otherrows
+            for i, r in enumerate(Progress(self.rows, 'diffing')):
+                yield i, r, otherrows[i] if i < len(otherrows) else None
+
+    def computeDiffs(self):
+        sheet, othersheet = self.sheet, self.othersheet
+
+        # pair up columns by name, or else by visible position
+        otherByName = {c.name: c for c in othersheet.visibleCols}
+        colpairs = []  # list of (render, otherrender, bit)
+        for i, col in enumerate(sheet.visibleCols):
+            othercol = otherByName.get(col.name)
+            if othercol is None and i < len(othersheet.visibleCols):
+                othercol = othersheet.visibleCols[i]
+            if othercol is None:
+                self.addedCols.add(col)
+                continue
+            bit = self.colbits[col] = 1 << len(colpairs)
+            colpairs.append((col.getCellRenderer(), othercol.getCellRenderer(), bit))
+
+        for i, row, otherrow in self.alignedRows():
+            if otherrow is None:
+                mask = ADDED
+            else:
+                mask = 0
+                for render, otherrender, bit in colpairs:
+                    if render(row).display != otherrender(otherrow).display:
+                        mask |= bit
+
+            if mask:
+                self.rowDiffs[id(row)] = mask
+                self.diffRowIdxs.append(i)
+
+        self.done = True
+
+
+def displayKey(sheet, row):
+    return tuple(c.getDisplayValue(row) for c in sheet.keyCols)
+
+
+def getSheetDiff(sheet):
+    'Return the SheetDiff of sheet against the diff source, or None if not (yet) computed.  Starts computing a new one if out of date.'
+    othersheet = vd().diffSheet
+    if othersheet is None or sheet is othersheet:
+        return None
+
+    d = sheetDiffs.get(sheet)
+    if d and not d.done and d.thread.is_alive():
+        return None
+
+    if (not d or d.othersheet is not othersheet or d.rows is not sheet.rows or d.otherrows is not othersheet.rows
+            or d.version != diffVersion(sheet, othersheet)):
+        if sheet.currentThreads or othersheet.currentThreads:  # wait until loaded
+            return None
+        d = sheetDiffs[sheet] = SheetDiff(sheet, othersheet)
+
+    if d.done:  # not if canceled, until either sheet changes
+        return d
+
+
+def colorizeDiffs(sheet, col, row, cellval):
+    if not row or not col:
+        return None
+    d = getSheetDiff(sheet)
+    if not d:
+        return None
+    if col in d.addedCols:
+        return 'color_diff_add'
+    mask = d.rowDiffs.get(id(row))
+    if mask is None:
+        return None
+    if mask == ADDED:
+        return 'color_diff_add'
+    if mask & d.colbits.get(col, 0):
+        return 'color_diff'
+
+
+def moveToNextDiff(sheet, reverse=False):
+    'Move cursor to the next (or previous) row that differs from the diff source.  Returns False if there is none.'
+    if vd().diffSheet is None:
+        fail('no diff sheet set')
+    d = getSheetDiff(sheet)
+    if not d:
+        fail('diff not computed yet')
+
+    idxs = d.diffRowIdxs
+    if reverse:
+        i = bisect.bisect_left(idxs, sheet.cursorRowIndex)
+        if i == 0:
+            return False
+        sheet.cursorRowIndex = idxs[i-1]
+    else:
+        i = bisect.bisect_right(idxs, sheet.cursorRowIndex)
+        if i == len(idxs):
+            return False
+        sheet.cursorRowIndex = idxs[i]
+    return True
 
 
 def setDiffSheet(vs):
-    Sheet.colorizers.append(CellColorizer(8, None, makeDiffColorizer(vs)))
+    'Show differences of all sheets against vs.'
+    if vd().diffSheet is None:
+        Sheet.colorizers.append(CellColorizer(8, None, colorizeDiffs))
+        Sheet.getColorizers.cache_clear()
+        Sheet.getColorizersByKind.cache_clear()
+    vd().diffSheet = vs
+    status('diffing all sheets against %s' % vs.name)
+
+
+vd().diffSheet = None  # all other sheets are compared against this one
@@ -1,4 +1,7 @@
+import array
+import bisect
 import math
+import threading
 
 from visidata import *
 
@@ -8,16 +11,21 @@ globalCommand('zF', 'freq-rows', 'vd.push(SheetFreqTable(sheet, Column("Total",
 
 theme('disp_histogram', '*', 'histogram element character')
 option('disp_histolen', 50, 'width of histogram column')
-#option('histogram_bins', 0, 'number of bins for histogram of numeric columns')
-#option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
+option('histogram_bins', 0, 'number of bins for frequency table of a numeric column (0 for a bin per distinct value)')
+option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
+option('freq_format_cache', 10000, 'number of distinct values per column to remember formatted while binning a frequency table')
 
 ColumnsSheet.addCommand(ENTER, 'freq-row', 'vd.push(SheetFreqTable(source[0], cursorRow))')
 
+def sourceLoaders(sheet):
+    'Return the threads loading rows into sheet, by its reload().'
+    return [t for t in sheet.currentThreads if t.name == 'reload' and t is not threading.current_thread()]
+
 def valueNames(vals):
     return '-'.join(str(v) for v in vals)
 
 
-# rowdef: (keys, source_rows)
+# rowdef: (keys, array of rowidxs into source.rows, as of when they were binned)
 class SheetFreqTable(Sheet):
     'Generate frequency-table sheet on currently selected column.'
     rowtype = 'bins'
@@ -30,7 +38,7 @@ class SheetFreqTable(Sheet):
         self.columns = [
             Column(c.name, type=c.type if c.type in typemap else anytype, width=c.width, fmtstr=c.fmtstr,
                         getter=lambda col,row,i=i: row[0][i],
-                        setter=lambda col,row,v,i=i,origCol=c: setitem(row[0], i, v) and origCol.setValues(row[1], v))
+                        setter=lambda col,row,v,i=i,origCol=c: setitem(row[0], i, v) and origCol.setValues(col.sheet.binRows(row), v))
                 for i, c in enumerate(self.origCols)
         ]
         self.setKeys(self.columns)  # origCols are now key columns
@@ -38,16 +46,19 @@ class SheetFreqTable(Sheet):
 
         self.columns.extend([
             Column('count', type=int, getter=lambda col,row: len(row[1]), sql='COUNT(*)'),
-            Column('percent', type=float, getter=lambda col,row: len(row[1])*100/col.sheet.source.nRows, sql=''),
+            Column('percent', type=float, getter=lambda col,row: len(row[1])*100/col.sheet.nbinned, sql=''),
             Column('histogram', type=str, getter=lambda col,row: options.disp_histogram*(options.disp_histolen*len(row[1])//col.sheet.largest), width=options.disp_histolen+2, sql=''),
         ])
 
+        self.groupAggregator = GroupAggregator((c, aggregator)
+                                                   for c in self.source.visibleCols
+                                                       for aggregator in getattr(c, 'aggregators', []))
+        self._aggregates = {}  # [id(bin row)] -> (nrows, list of aggregates)
         aggregatedCols = [Column(aggregator.__name__+'_'+c.name,
                                  type=aggregator.type or c.type,
-                                 getter=lambda col,row,origcol=c,aggr=aggregator: aggr(origcol, row[1]),
+                                 getter=lambda col,row,i=i: col.sheet.aggregates(row)[i],
                                  sql='%s(%s)' % (aggregator, c.name) )
-                             for c in self.source.visibleCols
-                                for aggregator in getattr(c, 'aggregators', [])
+                             for i, (c, aggregator) in enumerate(self.groupAggregator.colaggrs)
                          ]
         self.columns.extend(aggregatedCols)
 
@@ -59,105 +70,198 @@ class SheetFreqTable(Sheet):
         self.orderby = [(self.columns[nkeys], -1)]  # count desc
 
     def selectRow(self, row):
-        self.source.select(row[1])     # select all entries in the bin on the source sheet
+        self.source.select(self.binRows(row))  # select all entries in the bin on the source sheet
         return super().selectRow(row)  # then select the bin itself on this sheet
 
     def unselectRow(self, row):
-        self.source.unselect(row[1])
+        self.source.unselect(self.binRows(row))
         return super().unselectRow(row)
 
-    def numericBinning(self):
-        nbins = options.histogram_bins or int(len(self.source.rows) ** (1./2))
+    def binRows(self, row):
+        'Return list of the source rows in bin row.'
+        self.checkSourceRows()
+        rows = self.sourceRows
+        return [rows[i] for i in row[1]]
 
+    def aggregates(self, row):
+        'Return list of aggregates over the source rows in bin row, for all aggregated columns, computed together.'
+        nrows, results = self._aggregates.get(id(row), (None, None))
+        if nrows != len(row[1]):
+            results = self.groupAggregator.aggregate(self.binRows(row))
+            self._aggregates[id(row)] = (len(row[1]), results)
+        return results
+
+    def numericBinning(self):
+        'Put source rows into options.histogram_bins bins of the values of origCol: of even intervals between min and max, or with about the same number of rows each if options.histogram_even_interval.'
+        nbins = options.histogram_bins
         origCol = self.origCols[0]
+        edgetype = origCol.type if origCol.type in (int, date) else float
         self.columns[0].type = str
-
-        # separate rows with errors at the column from those without errors
-        errorbin = []
-        allbin = []
-        for row in Progress(self.source.rows, 'binning'):
+        isNull = isNullFunc()
+
+        # first pass: values as floats, separating rows with errors and nulls
+        errorRows = self.newBin()
+        nullRows = self.newBin()
+        valueRows = self.newBin()
+        values = array.array('d')
+        quantiles = QuantileSketch() if options.histogram_even_interval else None
+        rows = self.sourceRows
+        self.nbinned = len(rows)
+        for i in Progress(range(self.nbinned), 'binning'):
+            r = rows[i]
             try:
-                v = origCol.getTypedValue(row)
-                allbin.append((v, row))
+                v = origCol.getTypedValue(r)
+                if isinstance(v, TypedExceptionWrapper):
+                    errorRows.append(i)
+                    continue
+                if isNull(v):
+                    nullRows.append(i)
+                    continue
+                x = float(v)
             except Exception as e:
-                errorbin.append((e, row))
-
-        # find bin pivots from non-error values
-        binPivots = []
-        sortedValues = sorted(allbin, key=lambda x: x[0])
+                errorRows.append(i)
+                continue
+            values.append(x)
+            valueRows.append(i)
+            if quantiles:
+                quantiles.add(x)
+
+        edges = []  # lower bound of each bin
+        if values:
+            minval, maxval = min(values), max(values)
+            if quantiles:
+                pivots = sorted(set(quantiles.quantile(i/nbins) for i in range(1, nbins)) - {minval})
+                edges = [minval] + pivots
+                binidx = lambda x: bisect.bisect_right(pivots, x)
+            else:
+                if edgetype is int:  # bins of whole numbers
+                    width = max(1, math.ceil((maxval-minval+1)/nbins))
+                    nbins = math.ceil((maxval-minval+1)/width)
+                else:
+                    width = (maxval-minval)/nbins or 1
+                edges = [minval+width*i for i in range(nbins)]
+                binidx = lambda x: min(int((x-minval)/width), nbins-1)
+
+        # second pass: bin the values
+        binRows = [self.newBin() for x in edges]
+        for x, i in zip(values, Progress(valueRows, 'binning')):
+            binRows[binidx(x)].append(i)
+
+        fmt = lambda x: origCol.format(edgetype(x))
+        for i, rows in enumerate(binRows):
+            lo = edges[i]
+            if edgetype is int:
+                hi = edges[i+1]-1 if i+1 < len(edges) else maxval
+                binName = fmt(lo) if lo == hi else '%s - %s' % (fmt(lo), fmt(hi))
+            elif i+1 < len(edges):  # up to the next edge, which is in the next bin
+                binName = '[%s, %s)' % (fmt(lo), fmt(edges[i+1]))
+            else:
+                binName = '[%s, %s]' % (fmt(lo), fmt(maxval))
+            self.addRow(([binName], rows))
 
-        if options.histogram_even_interval:
-            binsize = len(sortedValues)/nbins
-            pivotIdx = 0
-            for i in range(math.ceil(len(sortedValues)/binsize)):
-                firstVal = sortedValues[int(pivotIdx)][0]
-                binPivots.append(firstVal)
-                pivotIdx += binsize
+        if nullRows:
+            self.rows.insert(0, (['nulls'], nullRows))
+        if errorRows:
+            self.rows.insert(0, (['errors'], errorRows))
 
-        else:
-            minval, maxval = sortedValues[0][0], sortedValues[-1][0]
-            binWidth = (maxval - minval)/nbins
-            binPivots = list((minval + binWidth*i) for i in range(0, nbins))
-
-        binPivots.append(None)
-
-        # put rows into bins (as self.rows) based on values
-        binMinIdx = 0
-        binMin = 0
-
-        for binMax in binPivots[1:-1]:
-            binrows = []
-            for i, (v, row) in enumerate(sortedValues[binMinIdx:]):
-                if binMax != binPivots[-2] and v > binMax:
-                    break
-                binrows.append(row)
-
-            binMaxDispVal = origCol.format(binMax)
-            binMinDispVal = origCol.format(binMin)
-            if binMinIdx == 0:
-                binName = '<=%s' % binMaxDispVal
-            elif binMax == binPivots[-2]:
-                binName = '>=%s' % binMinDispVal
-            else:
-                binName = '%s-%s' % (binMinDispVal, binMaxDispVal)
+        self.largest = max([self.largest] + [len(row[1]) for row in self.rows])
 
-            self.addRow((binName, binrows))
-            binMinIdx += i
-            binMin = binMax
+    def checkSourceRows(self):
+        'Fail if the source rows have moved since they were binned.'
+        src = self.source
+        if src.rows is not self.sourceRows or src.epoch != self.sourceEpoch or len(src.rows) < self.nbinned:
+            fail('%s rows have changed; reload %s' % (src.name, self.name))
 
-        if errorbin:
-            self.rows.insert(0, ('errors', errorbin))
+    def setSourceRows(self):
+        'Bin the rows of the source as they are now.  Bins have indexes into them, which stay valid while rows are only appended.'
+        self.sourceRows = self.source.rows
+        self.sourceEpoch = self.source.epoch
 
-        ntallied = sum(len(x[1]) for x in self.rows)
-        assert ntallied == len(self.source.rows), (ntallied, len(self.source.rows))
+    def newBin(self):
+        'Return empty array for the rowidxs of a bin.'
+        return array.array('I' if len(self.source.rows) < 2**32 else 'L')
 
     def discreteBinning(self):
-        rowidx = {}
-        for r in Progress(self.source.rows, 'binning'):
-            keys = list(forward(c.getTypedValue(r)) for c in self.origCols)
-
-            # wrapply will pass-through a key-able TypedWrapper
-            formatted_keys = tuple(wrapply(c.format, c.getTypedValue(r)) for c in self.origCols)
-            histrow = rowidx.get(formatted_keys)
+        'Bin source rows by the formatted values of origCols, following rows added to the source while it is loading; then reverse-sort by count.'
+        self._bins = {}  # [formatted keys] -> histrow
+        self._fmtcaches = [{} for c in self.origCols]  # [(type, value)] -> formatted value
+        rows = self.sourceRows
+        self.addSourceRows()
+        for t in sourceLoaders(self.source):
+            while t.is_alive() and self.source.rows is rows:
+                t.join(options.curses_timeout/1000)  # update at most once per redraw
+                if self.addSourceRows():
+                    self.sortBins()
+
+        if self.source.rows is rows:
+            self.addSourceRows()
+        self.sortBins()
+
+    def addSourceRows(self):
+        'Bin the source rows added since the last call, and return how many.  Each cell is typed and formatted once, and the formatted values of up to options.freq_format_cache distinct values per column are remembered.'
+        start = self.nbinned
+        newRows = self.sourceRows[start:]
+        self.nbinned += len(newRows)
+
+        bins = self._bins
+        cachesize = options.freq_format_cache
+        largest = self.largest
+        for i, r in enumerate(Progress(newRows, 'binning'), start):
+            keys = []
+            formatted_keys = []
+            for c, fmtcache in zip(self.origCols, self._fmtcaches):
+                v = c.getTypedValue(r)
+                keys.append(v)
+                if isinstance(v, TypedWrapper):
+                    formatted_keys.append(wrapply(c.format, v))  # wrapply will pass-through a key-able TypedWrapper
+                    continue
+                try:
+                    k = (type(v), v)  # 1 and 1.0 are equal but formatted differently
+                    formatted = fmtcache[k]
+                except KeyError:
+                    formatted = wrapply(c.format, v)
+                    if len(fmtcache) < cachesize:
+                        fmtcache[k] = formatted
+                except TypeError:  # unhashable
+                    formatted = wrapply(c.format, v)
+                formatted_keys.append(formatted)
+
+            formatted_keys = tuple(formatted_keys)
+            histrow = bins.get(formatted_keys)
             if histrow is None:
-                histrow = (keys, [])
-                rowidx[formatted_keys] = histrow
+                histrow = ([forward(v) for v in keys], self.newBin())
+                bins[formatted_keys] = histrow
                 self.addRow(histrow)
-            histrow[1].append(r)
-            self.largest = max(self.largest, len(histrow[1]))
+            histrow[1].append(i)
+            if len(histrow[1]) > largest:
+                largest = self.largest = len(histrow[1])
 
-        self.rows.sort(key=lambda r: len(r[1]), reverse=True)  # sort by num reverse
+        return len(newRows)
+
+    def sortBins(self):
+        'Reverse-sort bins by count.  The cursor stays on the same bin, unless it is on the first one.'
+        cursorRow = self.cursorRow if 0 < self.cursorRowIndex < len(self.rows) else None
+        self.rows = sorted(self.rows, key=lambda r: len(r[1]), reverse=True)  # not in place, which would empty rows meanwhile
+        if cursorRow is not None:
+            self.cursorRowIndex = next(i for i, r in enumerate(self.rows) if r is cursorRow)
 
 
     @asyncthread
     def reload(self):
         'Generate histrow for each row and then reverse-sort by length.'
         self.rows = []
-
-#        if len(self.origCols) == 1 and self.origCols[0].type in (int, float, currency):
-#            self.numericBinning()
-#        else:
-        self.discreteBinning()
+        self._aggregates = {}
+        self.nbinned = 0  # number of rows at the start of sourceRows that are in bins
+
+        if options.histogram_bins and len(self.origCols) == 1 and self.origCols[0].type in (int, float, currency, date):
+            for t in sourceLoaders(self.source):  # bin edges depend on all the values
+                while t.is_alive():  # in short waits, so this thread can be canceled
+                    t.join(options.curses_timeout/1000)
+            self.setSourceRows()
+            self.numericBinning()
+        else:
+            self.setSourceRows()
+            self.discreteBinning()
 
         # automatically add cache to all columns now that everything is binned
         for c in self.nonKeyVisibleCols:
@@ -167,5 +271,5 @@ SheetFreqTable.addCommand('t', 'stoggle-row', 'toggle([cursorRow]); cursorDown(1
 SheetFreqTable.addCommand('s', 'select-row', 'select([cursorRow]); cursorDown(1)')
 SheetFreqTable.addCommand('u', 'unselect-row', 'unselect([cursorRow]); cursorDown(1)')
 
-SheetFreqTable.addCommand(ENTER, 'dup-row', 'vs = copy(source); vs.name += "_"+valueNames(cursorRow[0]); vs.rows=copy(cursorRow[1]); vd.push(vs)')
-#        Command('v', 'options.histogram_even_interval = not options.histogram_even_interval; reload()', 'toggle histogram_even_interval option')
+SheetFreqTable.addCommand(ENTER, 'dup-row', 'vs = copy(source); vs.name += "_"+valueNames(cursorRow[0]); vs.rows=binRows(cursorRow); vd.push(vs)')
+SheetFreqTable.addCommand('v', 'toggle-histogram-interval', 'options.set("histogram_even_interval", not options.histogram_even_interval, sheet); reload()')
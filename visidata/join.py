@@ -1,11 +1,18 @@
 import collections
 import itertools
 import functools
+import math
+import operator
+import pickle
+import sys
+import tempfile
 from copy import copy
 
-from visidata import asyncthread, Progress, status, fail, error
+from visidata import asyncthread, Progress, status, fail, error, option, options
 from visidata import ColumnItem, ColumnExpr, SubrowColumn, Sheet, Column
-from visidata import SheetsSheet
+from visidata import SheetsSheet, addRowIdx, unpickleAll
+
+option('join_max_mem', 0.0, 'max MB of join keys to group in memory; larger joins are partitioned to temp files (0 for no limit)')
 
 SheetsSheet.addCommand('&', 'join-sheets', 'vd.replace(createJoinedSheet(selectedRows or fail("no sheets selected to join"), jointype=chooseOne(jointypes)))')
 
@@ -28,30 +35,157 @@ jointypes = {k:k for k in ["inner", "outer", "full", "diff", "append", "extend"]
 def joinkey(sheet, row):
     return tuple(c.getDisplayValue(row) for c in sheet.keyCols)
 
+def joinKeyFunc(sheet):
+    'Return func(row) -> joinkey(sheet, row), for many rows.'
+    renderers = [c.getCellRenderer() for c in sheet.keyCols]
+    return lambda row: tuple(render(row).display for render in renderers)
+
+
+def keyedRows(sheet, rows, gerund='grouping'):
+    'Generate (rowidx, joinkey) for each of rows of sheet.'
+    getKey = joinKeyFunc(sheet)
+    for rowidx, r in enumerate(Progress(rows, gerund)):
+        yield rowidx, getKey(r)
+
+
+def groupKeys(keyed, sizes, jointype='full'):
+    """Return list of dict [key] -> rowidx (or array of rowidxs), from the (rowidx, key) of each sheet in keyed, which has sizes rows.
+    Only keys which can be in the join are kept: for inner joins, those in every sheet, for which the sheets are grouped smallest first; for outer joins, those in the first sheet."""
+    if jointype == 'inner':
+        order = sorted(range(len(keyed)), key=lambda i: sizes[i])
+    else:
+        order = range(len(keyed))
+
+    groups = [None]*len(keyed)
+    keep = None  # keys to keep, or None for all
+    for i in order:
+        rowsByKey = groups[i] = {}
+        for rowidx, key in keyed[i]:
+            if keep is None or key in keep:
+                addRowIdx(rowsByKey, key, rowidx)
+
+        if jointype == 'inner' or (jointype == 'outer' and i == 0):
+            keep = rowsByKey
+
+    return groups
+
+
+def groupRowsByKey(sheets, sheetRows, jointype='full'):
+    'Return groupKeys of sheetRows of each sheet, computing the joinkey of each row once.'
+    return groupKeys([keyedRows(vs, rows) for vs, rows in zip(sheets, sheetRows)],
+                     [len(rows) for rows in sheetRows], jointype)
 
-def groupRowsByKey(sheets, rowsBySheetKey, rowsByKey):
-    with Progress(gerund='grouping', total=sum(len(vs.rows) for vs in sheets)*2) as prog:
-        for vs in sheets:
-            # tally rows by keys for each sheet
-            rowsBySheetKey[vs] = collections.defaultdict(list)
-            for r in vs.rows:
-                prog.addProgress(1)
-                key = joinkey(vs, r)
-                rowsBySheetKey[vs][key].append(r)
 
-        for vs in sheets:
-            for r in vs.rows:
+def rowidxList(v):
+    return (v,) if type(v) is int else v
+
+
+def joinKeys(groups, jointype, prog=None):
+    'Generate keys of groups in the join, in order of first appearance in the sheets.  Adds to prog for each key looked at, including the keys of later groups already generated from earlier ones.'
+    for i, g in enumerate(groups[:1] if jointype in ('inner', 'outer') else groups):
+        for k in g:
+            if prog is not None:
                 prog.addProgress(1)
-                key = joinkey(vs, r)
-                if key not in rowsByKey: # gather for this key has not been done yet
-                    # multiplicative for non-unique keys
-                    rowsByKey[key] = []
-                    for crow in itertools.product(*[rowsBySheetKey[vs2].get(key, [None]) for vs2 in sheets]):
-                        rowsByKey[key].append([key] + list(crow))
+            if not any(k in g2 for g2 in groups[:i]):
+                yield k
+
+
+def keyRows(sheetRows, groups, key, jointype):
+    """Generate joined rows (key, sheet1_row, sheet2_row, ...) with key for jointype.
+    Multiplicative for non-unique keys; each combination is generated as needed and not kept."""
+    subrows = []
+    for rows, g in zip(sheetRows, groups):
+        v = g.get(key)
+        subrows.append([None] if v is None else [rows[i] for i in rowidxList(v)])
+
+    for crow in itertools.product(*subrows):
+        combinedRow = (key,) + crow
+        if jointype == 'full':  # keep all rows from all sheets
+            yield combinedRow
+        elif jointype == 'inner':  # only rows with matching key on all sheets
+            if all(combinedRow):
+                yield combinedRow
+        elif jointype == 'outer':  # all rows from first sheet
+            if combinedRow[1]:
+                yield combinedRow
+        elif jointype == 'diff':  # only rows without matching key on all sheets
+            if not all(combinedRow):
+                yield combinedRow
+
+
+def joinedRows(sheetRows, groups, jointype):
+    'Generate joined rows for jointype, by key in order of first appearance in the sheets.'
+    total = len(groups[0]) if jointype in ('inner', 'outer') else sum(len(g) for g in groups)  # keys looked at by joinKeys
+    with Progress(gerund='joining', total=total) as prog:
+        for key in joinKeys(groups, jointype, prog):
+            yield from keyRows(sheetRows, groups, key, jointype)
+
+
+def joinPartitions(sheets, sheetRows):
+    'Return how many partitions the keys of sheetRows need to be split into to fit in options.join_max_mem, estimated from the first rows of each sheet.'
+    maxmem = options.join_max_mem
+    if not maxmem:
+        return 1
+
+    nbytes = 0
+    for vs, rows in zip(sheets, sheetRows):
+        getKey = joinKeyFunc(vs)
+        sample = [getKey(r) for r in rows[:1000]]
+        if sample:
+            keybytes = sum(sys.getsizeof(k) + sum(map(sys.getsizeof, k)) for k in sample)/len(sample)
+            nbytes += len(rows) * (keybytes + 100)  # dict entry, rowidx, and (rowidx, key) tuple
+    return min(math.ceil(nbytes/(maxmem*1024*1024)), 256)
+
+
+def firstAppearance(groups, key):
+    'Return (sheetnum, rowidx) of the first row with key.'
+    for sheetnum, g in enumerate(groups):
+        v = g.get(key)
+        if v is not None:
+            return sheetnum, rowidxList(v)[0]
+
+
+def partitionedJoinRows(sheets, sheetRows, jointype, nparts):
+    """Generate joined rows like joinedRows, grouping only one partition of the keys in memory at a time.
+    The (sheetnum, rowidx, key) of all rows are spilled to nparts temp files by hash of key; the joined rows of each key are put back in order at the end."""
+    files = [tempfile.TemporaryFile() for i in range(nparts)]
+    try:
+        for sheetnum, (vs, rows) in enumerate(zip(sheets, sheetRows)):
+            bufs = [[] for fp in files]
+            for rowidx, key in keyedRows(vs, rows, 'partitioning'):
+                part = hash(key) % nparts
+                bufs[part].append((sheetnum, rowidx, key))
+                if len(bufs[part]) >= 1000:
+                    pickle.dump(bufs[part], files[part], pickle.HIGHEST_PROTOCOL)
+                    bufs[part] = []
+            for buf, fp in zip(bufs, files):
+                pickle.dump(buf, fp, pickle.HIGHEST_PROTOCOL)
+
+        joined = []  # [((sheetnum, rowidx) of first row with key, [joined rows with key])]
+        for fp in Progress(files, 'joining'):
+            fp.seek(0)
+            keyed = [[] for vs in sheets]
+            for sheetnum, rowidx, key in unpickleAll(fp):
+                keyed[sheetnum].append((rowidx, key))
+            fp.close()
+
+            groups = groupKeys(keyed, [len(k) for k in keyed], jointype)
+            del keyed
+            for key in joinKeys(groups, jointype):
+                rows = list(keyRows(sheetRows, groups, key, jointype))
+                if rows:
+                    joined.append((firstAppearance(groups, key), rows))
+
+        joined.sort(key=operator.itemgetter(0))
+        for pos, rows in joined:
+            yield from rows
+    finally:
+        for fp in files:
+            fp.close()
 
 
 #### slicing and dicing
-# rowdef: [(key, ...), sheet1_row, sheet2_row, ...]
+# rowdef: ((key, ...), sheet1_row, sheet2_row, ...)
 #   if a sheet does not have this key, sheet#_row is None
 class SheetJoin(Sheet):
     'Column-wise join/merge. `jointype` constructor arg should be one of jointypes.'
@@ -74,45 +208,29 @@ class SheetJoin(Sheet):
                 newname = c.name if ctr[c.name] == 1 else '%s_%s' % (vs.name, c.name)
                 self.addColumn(SubrowColumn(newname, c, sheetnum+1))
 
-        rowsBySheetKey = {}
-        rowsByKey = {}
-
-        groupRowsByKey(sheets, rowsBySheetKey, rowsByKey)
+        sheetRows = [list(vs.rows) for vs in sheets]  # rowidxs stay valid if the source rows are sorted meanwhile
+        nparts = joinPartitions(sheets, sheetRows)
+        if nparts > 1:
+            combinedRows = partitionedJoinRows(sheets, sheetRows, self.jointype, nparts)
+        else:
+            combinedRows = joinedRows(sheetRows, groupRowsByKey(sheets, sheetRows, self.jointype), self.jointype)
 
         self.rows = []
-
-        with Progress(gerund='joining', total=len(rowsByKey)) as prog:
-            for k, combinedRows in rowsByKey.items():
-                prog.addProgress(1)
-
-                if self.jointype == 'full':  # keep all rows from all sheets
-                    for combinedRow in combinedRows:
-                        self.addRow(combinedRow)
-
-                elif self.jointype == 'inner':  # only rows with matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if all(combinedRow):
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'outer':  # all rows from first sheet
-                    for combinedRow in combinedRows:
-                        if combinedRow[1]:
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'diff':  # only rows without matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if not all(combinedRow):
-                            self.addRow(combinedRow)
+        for combinedRow in combinedRows:
+            self.addRow(combinedRow)
 
 
 ## for ExtendedSheet_reload below
 class ExtendedColumn(Column):
     def calcValue(self, row):
         key = joinkey(self.sheet.joinSources[0], row)
-        srcsheet = self.sheet.joinSources[self.sheetnum]
-        srcrow = self.sheet.rowsBySheetKey[srcsheet][key]
-        if srcrow[0]:
-            return self.sourceCol.calcValue(srcrow[0])
+        srcrows = self.sheet.joinSourceRows[self.sheetnum]
+        rowidx = self.sheet.joinGroups[self.sheetnum].get(key)
+        if rowidx is None:
+            raise IndexError('no row with key %s' % (key,))
+        srcrow = srcrows[rowidxList(rowidx)[0]]
+        if srcrow:
+            return self.sourceCol.calcValue(srcrow)
 
 
 @asyncthread
@@ -137,19 +255,25 @@ def ExtendedSheet_reload(self, sheets):
             newcol = ExtendedColumn(newname, sheetnum=sheetnum+1, sourceCol=c)
             self.addColumn(newcol)
 
-    self.rowsBySheetKey = {}  # [srcSheet][key] -> list(rowobjs from sheets[0])
-    rowsByKey = {}  # [key] -> [key, rows0, rows1, ...]
-
-    groupRowsByKey(sheets, self.rowsBySheetKey, rowsByKey)
+    self.joinSourceRows = [list(vs.rows) for vs in sheets]
+    self.joinGroups = groupRowsByKey(sheets, self.joinSourceRows, 'extend')  # [sheetnum][key] -> rowidxs into joinSourceRows[sheetnum]
 
     self.rows = []
 
-    with Progress(gerund='joining', total=len(rowsByKey)) as prog:
-        for k, combinedRows in rowsByKey.items():
+    rows0 = self.joinSourceRows[0]
+    with Progress(gerund='joining', total=len(self.joinGroups[0])) as prog:
+        for key, rowidxs in self.joinGroups[0].items():
             prog.addProgress(1)
-            for combinedRow in combinedRows:
-                if combinedRow[1]:
-                    self.addRow(combinedRow[1])
+            # each row of the first sheet once per combination of rows with its key in the other sheets
+            ncombos = 1
+            for g in self.joinGroups[1:]:
+                v = g.get(key)
+                if v is not None:
+                    ncombos *= len(rowidxList(v))
+            for i in rowidxList(rowidxs):
+                if rows0[i]:
+                    for n in range(ncombos):
+                        self.addRow(rows0[i])
 
 
 ## for SheetConcat
@@ -2,6 +2,7 @@ import itertools
 import re
 
 from visidata import vd, VisiData, error, status, Sheet, Column, regex_flags, rotate_range, fail
+from visidata.textindex import indexedMatches, nextIndexedMatch
 
 vd.searchContext = {}  # regex, columns, backward to kwargs from previous search
 
@@ -18,10 +19,11 @@ Sheet.addCommand('N', 'prev-search', 'vd.moveRegex(sheet, reverse=True)'),
 Sheet.addCommand('g/', 'search-cols', 'vd.moveRegex(sheet, regex=input("g/", type="regex", defaultLast=True), backward=False, columns="visibleCols")'),
 Sheet.addCommand('g?', 'searchr-cols', 'vd.moveRegex(sheet, regex=input("g?", type="regex", defaultLast=True), backward=True, columns="visibleCols")'),
 
-Sheet.addCommand('<', 'prev-value', 'moveToNextRow(lambda row,sheet=sheet,col=cursorCol,val=cursorValue: col.getValue(row) != val, reverse=True) or status("no different value up this column")'),
-Sheet.addCommand('>', 'next-value', 'moveToNextRow(lambda row,sheet=sheet,col=cursorCol,val=cursorValue: col.getValue(row) != val) or status("no different value down this column")'),
-Sheet.addCommand('{', 'prev-selected', 'moveToNextRow(lambda row,sheet=sheet: sheet.isSelected(row), reverse=True) or status("no previous selected row")'),
-Sheet.addCommand('}', 'next-selected', 'moveToNextRow(lambda row,sheet=sheet: sheet.isSelected(row)) or status("no next selected row")'),
+Sheet.addCommand('<', 'prev-value', 'moveToNextValue(cursorCol, reverse=True) or status("no different value up this column")'),
+Sheet.addCommand('>', 'next-value', 'moveToNextValue(cursorCol) or status("no different value down this column")'),
+Sheet.addCommand('zg', 'go-value', 'moveToValue(cursorCol, cursorCol.type(input("move to value: "))) or status("no row with that value")'),
+Sheet.addCommand('{', 'prev-selected', 'moveToNextSelected(reverse=True) or status("no previous selected row")'),
+Sheet.addCommand('}', 'next-selected', 'moveToNextSelected() or status("no next selected row")'),
 
 Sheet.addCommand('z<', 'prev-null', 'moveToNextRow(lambda row,col=cursorCol,isnull=isNullFunc(): isnull(col.getValue(row)), reverse=True) or status("no null down this column")'),
 Sheet.addCommand('z>', 'next-null', 'moveToNextRow(lambda row,col=cursorCol,isnull=isNullFunc(): isnull(col.getValue(row))) or status("no null down this column")'),
@@ -44,6 +46,21 @@ def moveToNextRow(vs, func, reverse=False):
 Sheet.moveToNextRow = moveToNextRow
 
 
+def moveToNextSelected(vs, reverse=False):
+    'Move cursor to next (prev if reverse) selected row.  Returns False if there is none.'
+    flags = vs.selectedFlags
+    if reverse:
+        i = flags.rfind(1, 0, max(vs.cursorRowIndex, 0))
+    else:
+        i = flags.find(1, vs.cursorRowIndex+1)
+    if i < 0:
+        return False
+    vs.cursorRowIndex = i
+    return True
+
+Sheet.moveToNextSelected = moveToNextSelected
+
+
 def nextColRegex(sheet, colregex):
     'Go to first visible column after the cursor matching `colregex`.'
     pivot = sheet.cursorVisibleColIndex
@@ -92,6 +109,22 @@ def searchRegex(vd, sheet, moveCursor=False, reverse=False, **kwargs):
         if reverse:
             searchBackward = not searchBackward
 
+        matches = indexedMatches(columns, regex)
+        if matches is not None:  # from the text index of each column
+            if moveCursor:
+                found = nextIndexedMatch(sheet, columns, matches, backward=searchBackward)
+                if found:
+                    r, c = found
+                    sheet.cursorRowIndex = r
+                    sheet.cursorVisibleColIndex = sheet.visibleCols.index(c)
+                    return
+                rowidxs = []
+            else:
+                rowidxs = sorted(set(itertools.chain(*matches.values())))
+                yield from rowidxs
+            status('%s matches for /%s/' % (len(rowidxs), regex.pattern))
+            return
+
         matchingRowIndexes = 0
         for r in rotate_range(len(sheet.rows), sheet.cursorRowIndex, reverse=searchBackward):
             c = findMatchingColumn(sheet, sheet.rows[r], columns, regex.search)
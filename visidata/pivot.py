@@ -1,8 +1,10 @@
+import array
+
 from visidata import *
 
 Sheet.addCommand('W', 'pivot', 'vd.push(SheetPivot(sheet, [cursorCol]))')
 
-# rowdef: (tuple(keyvalues), dict(variable_value -> list(rows)))
+# rowdef: (tuple(keyvalues), dict(variable_value -> array(rowidxs into source.rows, as of when they were pivoted)), dict(variable_value -> list(aggregates)), list(total aggregates))
 class SheetPivot(Sheet):
     'Summarize key columns in pivot table and display as new sheet.'
     rowtype = 'aggregated rows'
@@ -11,7 +13,9 @@ class SheetPivot(Sheet):
         super().__init__(srcsheet.name+'_pivot_'+''.join(c.name for c in variableCols),
                          source=srcsheet)
 
+    @asyncthread
     def reload(self):
+        'Group source rows by key and variable values, discovering the variable values and aggregating, all in one pass.'
         self.nonpivotKeyCols = []
 
         for colnum, col in enumerate(self.source.keyCols):
@@ -20,12 +24,6 @@ class SheetPivot(Sheet):
                                 getter=lambda col,row,colnum=colnum: row[0][colnum])
                 self.nonpivotKeyCols.append(newcol)
 
-        # two different threads for better interactive display
-        self.reloadCols()
-        self.reloadRows()
-
-    @asyncthread
-    def reloadCols(self):
         self.columns = copy(self.nonpivotKeyCols)
         self.setKeys(self.columns)
 
@@ -34,53 +32,89 @@ class SheetPivot(Sheet):
         if not aggcols:
             aggcols = [(c, aggregators["count"]) for c in self.variableCols]
 
-        for col in self.variableCols:
-            for aggcol, aggregator in aggcols:
-                aggname = '%s_%s' % (aggcol.name, aggregator.__name__)
-
-                allValues = set()
-                for value in Progress(col.getValues(self.source.rows), 'pivoting', total=len(self.source.rows)):
-                    if value not in allValues:
-                        allValues.add(value)
-                        c = Column('%s_%s' % (aggname, value),
-                                type=aggregator.type or aggcol.type,
-                                getter=lambda col,row,aggcol=aggcol,aggvalue=value,agg=aggregator: agg(aggcol, row[1].get(aggvalue, [])))
-                        c.aggvalue = value
-                        self.addColumn(c)
-
-                if aggregator.__name__ != 'count':  # already have count above
-                    c = Column('Total_' + aggname,
-                                type=aggregator.type or aggcol.type,
-                                getter=lambda col,row,aggcol=aggcol,agg=aggregator: agg(aggcol, sum(row[1].values(), [])))
-                    self.addColumn(c)
-
-            c = Column('Total_count',
-                        type=int,
-                        getter=lambda col,row: len(sum(row[1].values(), [])))
-            self.addColumn(c)
-
+        groupAggregator = GroupAggregator(aggcols)
+        isNull = isNullFunc()
+        allValues = [dict() for c in self.variableCols]  # non-null variable values of each variableCol, in order of appearance
+        states = {}  # [(id(pivotrow), variable_value)] -> state of groupAggregator
 
-    @asyncthread
-    def reloadRows(self):
+        rows = self.sourceRows = self.source.rows  # bins have indexes into this, which stay valid while rows are only appended
+        self.sourceEpoch = self.source.epoch
+        self.npivoted = len(rows)
         rowidx = {}
         self.rows = []
-        for r in Progress(self.source.rows, 'pivoting'):
+        for i in Progress(range(self.npivoted), 'pivoting'):
+            r = rows[i]
             keys = tuple(forward(keycol.origcol.getTypedValue(r)) for keycol in self.nonpivotKeyCols)
             formatted_keys = tuple(wrapply(c.format, v) for v, c in zip(keys, self.nonpivotKeyCols))
 
             pivotrow = rowidx.get(formatted_keys)
             if pivotrow is None:
-                pivotrow = (keys, {})
+                pivotrow = (keys, {}, {}, [])
                 rowidx[formatted_keys] = pivotrow
                 self.addRow(pivotrow)
 
-            for col in self.variableCols:
+            for col, values in zip(self.variableCols, allValues):
                 varval = col.getTypedValueOrException(r)
                 matchingRows = pivotrow[1].get(varval)
                 if matchingRows is None:
-                    pivotrow[1][varval] = [r]
+                    pivotrow[1][varval] = array.array('L', [i])
+                    state = states[(id(pivotrow), varval)] = groupAggregator.init()
+                    if not isNull(varval):
+                        values[varval] = True
                 else:
-                    matchingRows.append(r)
+                    matchingRows.append(i)
+                    state = states[(id(pivotrow), varval)]
+                groupAggregator.accumulate(state, r)
+
+        # aggregates of each bin, and totals by merging those of each row
+        self.emptyAggregates = groupAggregator.finalize(groupAggregator.init())
+        for pivotrow in Progress(self.rows, 'aggregating'):
+            total = groupAggregator.init()
+            for varval in pivotrow[1]:
+                state = states[(id(pivotrow), varval)]
+                pivotrow[2][varval] = groupAggregator.finalize(state)
+                groupAggregator.merge(total, state)
+            pivotrow[3].extend(groupAggregator.finalize(total))
+
+        for col, values in zip(self.variableCols, allValues):
+            for aggidx, (aggcol, aggregator) in enumerate(aggcols):
+                aggname = '%s_%s' % (aggcol.name, aggregator.__name__)
+
+                for value in values:
+                    c = Column('%s_%s' % (aggname, value),
+                            type=aggregator.type or aggcol.type,
+                            getter=lambda col,row,aggvalue=value,aggidx=aggidx: row[2].get(aggvalue, col.sheet.emptyAggregates)[aggidx])
+                    c.aggvalue = value
+                    self.addColumn(c)
+
+                if aggregator.__name__ != 'count':  # already have count above
+                    c = Column('Total_' + aggname,
+                                type=aggregator.type or aggcol.type,
+                                getter=lambda col,row,aggidx=aggidx: row[3][aggidx])
+                    self.addColumn(c)
+
+            c = Column('Total_count',
+                        type=int,
+                        getter=lambda col,row: sum(len(rowidxs) for rowidxs in row[1].values()))
+            self.addColumn(c)
 
-SheetPivot.addCommand('z'+ENTER, 'dive-cell', 'vs=copy(source); vs.name+="_%s"%cursorCol.aggvalue; vs.rows=cursorRow[1].get(cursorCol.aggvalue, []); vd.push(vs)')
-SheetPivot.addCommand(ENTER, 'dive-row', 'vs=copy(source); vs.name+="_%s"%"+".join(cursorRow[0]); vs.rows=sum(cursorRow[1].values(), []); vd.push(vs)')
+    def checkSourceRows(self):
+        'Fail if the source rows have moved since they were pivoted.'
+        src = self.source
+        if src.rows is not self.sourceRows or src.epoch != self.sourceEpoch or len(src.rows) < self.npivoted:
+            fail('%s rows have changed; reload %s' % (src.name, self.name))
+
+    def binRows(self, row, aggvalue):
+        'Return list of source rows in the bin of aggvalue in pivot row.'
+        self.checkSourceRows()
+        rows = self.sourceRows
+        return [rows[i] for i in row[1].get(aggvalue, [])]
+
+    def allBinRows(self, row):
+        'Return list of source rows in all bins of pivot row.'
+        self.checkSourceRows()
+        rows = self.sourceRows
+        return [rows[i] for rowidxs in row[1].values() for i in rowidxs]
+
+SheetPivot.addCommand('z'+ENTER, 'dive-cell', 'vs=copy(source); vs.name+="_%s"%cursorCol.aggvalue; vs.rows=binRows(cursorRow, cursorCol.aggvalue); vd.push(vs)')
+SheetPivot.addCommand(ENTER, 'dive-row', 'vs=copy(source); vs.name+="_%s"%"+".join(cursorRow[0]); vs.rows=allBinRows(cursorRow); vd.push(vs)')
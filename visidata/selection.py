@@ -6,7 +6,7 @@ Sheet.addCommand('u', 'unselect-row', 'unselect([cursorRow]); cursorDown(1)'),
 
 Sheet.addCommand('gt', 'stoggle-rows', 'toggle(rows)'),
 Sheet.addCommand('gs', 'select-rows', 'select(rows)'),
-Sheet.addCommand('gu', 'unselect-rows', '_selectedRows.clear()'),
+Sheet.addCommand('gu', 'unselect-rows', 'clearSelected()'),
 
 Sheet.addCommand('zt', 'stoggle-before', 'toggle(rows[:cursorRowIndex])'),
 Sheet.addCommand('zs', 'select-before', 'select(rows[:cursorRowIndex])'),
@@ -20,8 +20,9 @@ Sheet.addCommand('\\', 'unselect-col-regex', 'unselectByIdx(vd.searchRegex(sheet
 Sheet.addCommand('g|', 'select-cols-regex', 'selectByIdx(vd.searchRegex(sheet, regex=input("g|", type="regex", defaultLast=True), columns="visibleCols"))'),
 Sheet.addCommand('g\\', 'unselect-cols-regex', 'unselectByIdx(vd.searchRegex(sheet, regex=input("g\\\\", type="regex", defaultLast=True), columns="visibleCols"))'),
 
-Sheet.addCommand(',', 'select-equal-cell', 'select(gatherBy(lambda r,c=cursorCol,v=cursorTypedValue: c.getTypedValue(r) == v), progress=False)'),
-Sheet.addCommand('g,', 'select-equal-row', 'select(gatherBy(lambda r,currow=cursorRow,vcols=visibleCols: all([c.getTypedValue(r) == c.getTypedValue(currow) for c in vcols])), progress=False)'),
+Sheet.addCommand(',', 'select-equal-cell', 'select(gatherByValue(cursorCol, cursorTypedValue), progress=False)'),
+Sheet.addCommand('z,', 'select-range', 'select(gatherByRange(cursorCol, *parseRange(cursorCol, input("select range of values lo..hi (up to, not including hi): "))), progress=False)'),
+Sheet.addCommand('g,', 'select-equal-row', 'select(gatherByRowValues(cursorRow, visibleCols), progress=False)'),
 
-Sheet.addCommand('z|', 'select-expr', 'expr=inputExpr("select by expr: "); select(gatherBy(lambda r, sheet=sheet, expr=expr: sheet.evalexpr(expr, r)), progress=False)'),
-Sheet.addCommand('z\\', 'unselect-expr', 'expr=inputExpr("unselect by expr: "); unselect(gatherBy(lambda r, sheet=sheet, expr=expr: sheet.evalexpr(expr, r)), progress=False)')
+Sheet.addCommand('z|', 'select-expr', 'expr=inputExpr("select by expr: "); select(gatherByExpr(expr), progress=False)'),
+Sheet.addCommand('z\\', 'unselect-expr', 'expr=inputExpr("unselect by expr: "); unselect(gatherByExpr(expr), progress=False)')
@@ -0,0 +1,204 @@
+'Approximate statistics over streams of values in bounded memory.  All are mergeable, to combine partial results.'
+
+import hashlib
+import math
+import random
+
+_M64 = (1 << 64) - 1
+
+def hash64(v):
+    'Well-mixed 64-bit hash of v, the same in every process, so that sketches from worker processes can be merged.'
+    if not isinstance(v, (int, float)):  # hash() of str and bytes is randomized per process
+        b = v.encode('utf-8', 'surrogatepass') if isinstance(v, str) else repr(v).encode('utf-8', 'surrogatepass')
+        return int.from_bytes(hashlib.sha1(b).digest()[:8], 'little')
+
+    # hash() of numbers is not randomized, but of small ints is the int itself
+    z = (hash(v) + 0x9E3779B97F4A7C15) & _M64  # splitmix64 finalizer
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _M64
+    return z ^ (z >> 31)
+
+
+class DistinctCounter:
+    'Number of distinct values: exact up to maxexact values, then estimated by HyperLogLog with 2**p registers (about 1.04/sqrt(2**p) error).  len() is the count.'
+    def __init__(self, p=14, maxexact=10000):
+        self.p = p
+        self.maxexact = maxexact
+        self.exact = set()      # distinct values, until there are more than maxexact
+        self.registers = None   # HyperLogLog registers after that
+
+    def add(self, v):
+        if self.registers is None:
+            self.exact.add(v)
+            if len(self.exact) > self.maxexact:
+                self.registers = bytearray(1 << self.p)
+                for x in self.exact:
+                    self.addHash(hash64(x))
+                self.exact = None
+        else:
+            self.addHash(hash64(v))
+
+    def addHash(self, h):
+        p = self.p
+        i = h >> (64-p)
+        rank = min(65 - ((h << p) & _M64).bit_length(), 65 - p)  # position of first 1 bit after the index bits
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def merge(self, other):
+        if other.registers is None:
+            for x in other.exact:
+                self.add(x)
+            return
+        if self.registers is None:
+            exact = self.exact
+            self.exact = None
+            self.registers = bytearray(other.registers)
+            for x in exact:
+                self.addHash(hash64(x))
+            return
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def __len__(self):
+        if self.registers is None:
+            return len(self.exact)
+        m = len(self.registers)
+        est = 0.7213/(1+1.079/m) * m * m / sum(2.0**-r for r in self.registers)
+        nzero = self.registers.count(0)
+        if est <= 2.5*m and nzero:  # small range correction: linear counting
+            est = m * math.log(m/nzero)
+        return int(round(est))
+
+
+class FrequentValues:
+    'Heavy hitters by Misra-Gries summary with k counters: any value with more than n/(k+1) occurrences is kept, with its count underestimated by at most that.  Counts are exact with at most k distinct values.'
+    def __init__(self, k=1000):
+        self.k = k
+        self.counts = {}  # [value] -> count
+        self.n = 0
+
+    def add(self, v):
+        self.n += 1
+        counts = self.counts
+        if v in counts:
+            counts[v] += 1
+        elif len(counts) < self.k:
+            counts[v] = 1
+        else:
+            self.decrement(1)
+
+    def decrement(self, d):
+        'Subtract d from all counts, dropping those that reach zero.'
+        self.counts = {v: c-d for v, c in self.counts.items() if c > d}
+
+    def merge(self, other):
+        self.n += other.n
+        for v, c in other.counts.items():
+            self.counts[v] = self.counts.get(v, 0) + c
+        if len(self.counts) > self.k:
+            self.decrement(sorted(self.counts.values(), reverse=True)[self.k])
+
+    def mode(self):
+        if not self.counts:
+            raise ValueError('no values')
+        return max(self.counts.items(), key=lambda vc: vc[1])[0]
+
+
+class QuantileSketch:
+    'Approximate quantiles, by levels of samples, each value at level h standing for 2**h values (a simplified KLL sketch).  Exact min and max.'
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.random = random.Random(seed)
+
+    def add(self, v):
+        if self.n == 0:
+            self.min = self.max = v
+        elif v < self.min:
+            self.min = v
+        elif self.max < v:
+            self.max = v
+        self.n += 1
+        level0 = self.levels[0]
+        level0.append(v)
+        if len(level0) >= self.k:
+            self.compact()
+
+    def compact(self):
+        'Halve full levels, promoting every other (sorted) value to the next level with twice the weight.'
+        for h, items in enumerate(self.levels):
+            if len(items) >= self.k:
+                items.sort()
+                promoted = items[self.random.randint(0, 1)::2]
+                items.clear()
+                if h+1 == len(self.levels):
+                    self.levels.append([])
+                self.levels[h+1].extend(promoted)
+
+    def merge(self, other):
+        if not other.n:
+            return
+        if not self.n:
+            self.min, self.max = other.min, other.max
+        else:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.n += other.n
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append([])
+            self.levels[h].extend(items)
+        self.compact()
+
+    def quantile(self, q):
+        'Return the value with about q*n values before it, for 0 <= q <= 1.'
+        if not self.n:
+            raise ValueError('no values')
+        weighted = sorted((v, 1 << h) for h, items in enumerate(self.levels) for v in items)
+        target = q * sum(w for v, w in weighted)
+        cum = 0
+        for v, w in weighted:
+            cum += w
+            if cum >= target:
+                return v
+        return weighted[-1][0]
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class Moments:
+    'Count, mean and variance by Welford\'s online algorithm; merged by Chan\'s formula.'
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self.m2 += delta * (x - self._mean)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if not n:
+            return
+        delta = other._mean - self._mean
+        self._mean += delta * other.n / n
+        self.m2 += other.m2 + delta*delta * self.n * other.n / n
+        self.n = n
+
+    def mean(self):
+        if not self.n:
+            raise ValueError('no values')
+        return self._mean
+
+    def stdev(self):
+        'Sample standard deviation, like statistics.stdev.'
+        if self.n < 2:
+            raise ValueError('stdev requires at least two values')
+        return math.sqrt(self.m2 / (self.n-1))
@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import patch
+
+import visidata
+
+
+class DescribeWorkersTestCase(unittest.TestCase):
+    def describe(self, vs, workers):
+        visidata.options.describe_workers = workers
+        vs2 = visidata.DescribeSheet('describe', source=[vs])
+        vs2.reload()
+        return {c.name: len(vs2.describeData[c]['distinct']) for c in vs2.rows}
+
+    @patch.object(visidata.vd(), 'execAsync', lambda func, *args, sheet=None, **kwargs: func(*args, **kwargs))
+    @patch('visidata.describe.describe_chunk_rows', 20000)  # more distinct values than a sketch counts exactly
+    def test_sketchMergesAcrossWorkers(self):
+        'distinct counts sketched in separate worker processes are merged the same as in this one'
+        rows = [['s%d' % (i % 15000), i % 15000] for i in range(30000)]
+        vs = visidata.Sheet('source', rows=rows, columns=[visidata.ColumnItem('s', 0), visidata.ColumnItem('i', 1, type=int)])
+        visidata.options.describe_sketch = 1
+        try:
+            inprocess = self.describe(vs, 0)
+            self.assertEqual(self.describe(vs, 2), inprocess)
+            for n in inprocess.values():
+                self.assertLess(abs(n-15000), 15000*0.05)
+        finally:
+            visidata.options.describe_sketch = 0
+            visidata.options.describe_workers = 0
+
+
+if __name__ == '__main__':
+    unittest.main()
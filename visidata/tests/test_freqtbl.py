@@ -0,0 +1,50 @@
+import threading
+import time
+import unittest
+
+import visidata
+
+
+class FreqTableTestCase(unittest.TestCase):
+    def test_followsLoader(self):
+        'bin rows as the source loads them, without waiting on its other threads'
+        vs = visidata.Sheet('source', columns=[visidata.ColumnItem('a', 0)])
+        vs.rows = []
+        done = threading.Event()
+
+        def reload():  # named as a loader
+            for i in range(5):
+                vs.rows.append([i % 2])
+                time.sleep(0.05)
+
+        def other():
+            done.wait(10)
+
+        try:
+            vd = visidata.vd()
+            vd.execAsync(reload, sheet=vs)
+            vd.execAsync(other, sheet=vs)
+            freq = visidata.SheetFreqTable(vs, vs.columns[0])
+            t = freq.reload()
+            t.join(5)
+            self.assertFalse(t.is_alive())
+            self.assertEqual([(r[0], len(r[1])) for r in freq.rows], [([0], 3), ([1], 2)])
+        finally:
+            done.set()
+
+    def test_binRowsOfSourceRows(self):
+        'bins refer to the source rows until they move'
+        vs = visidata.Sheet('source', columns=[visidata.ColumnItem('a', 0)])
+        vs.rows = [[i % 2] for i in range(5)]
+        freq = visidata.SheetFreqTable(vs, vs.columns[0])
+        freq.reload().join(5)
+        vs.rows.append([0])  # appended rows do not move the binned ones
+        self.assertEqual(freq.binRows(freq.rows[0]), [vs.rows[i] for i in (0, 2, 4)])
+        vs.rows.reverse()
+        vs.bumpEpoch()
+        with self.assertRaises(visidata.ExpectedException):
+            freq.binRows(freq.rows[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+'Index of displayed text per column, to narrow regex searches to candidate values.'
+
+import array
+import bisect
+import itertools
+import weakref
+
+# the regex parser is private to re: it is re._parser from Python 3.11, where
+# importing sre_parse is deprecated, and only sre_parse before that
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from visidata import option, options, asyncthread, Progress, status
+
+option('search_index', 0, 'index displayed text of searched columns on sheets with at least this many rows, for faster repeat regex searches (0 to disable)')
+
+textIndexes = weakref.WeakKeyDictionary()  # [Column] -> ColumnTextIndex
+
+
+def textVersion(col):
+    'Anything the displayed values of col depend on.'
+    sheet = col.sheet
+    return (col.epoch, sheet.epoch, id(sheet.rows), len(sheet.rows), options._epoch)
+
+
+def requiredTrigrams(regex):
+    'Return set of lowercase ASCII trigrams that any string matched by compiled regex must contain (empty if none are certain).'
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return set()
+
+    ret = set()
+    def addRun(run):
+        s = ''.join(run).lower()
+        ret.update(s[i:i+3] for i in range(len(s)-2))
+        run.clear()
+
+    def addLiterals(items):
+        run = []  # consecutive ASCII literals
+        for op, av in items:
+            if op is sre_parse.LITERAL and av < 128:
+                run.append(chr(av))
+                continue
+            addRun(run)
+            if op is sre_parse.SUBPATTERN:  # group must match as a whole
+                addLiterals(av[-1])
+        addRun(run)
+
+    addLiterals(parsed)
+    return ret
+
+
+class ColumnTextIndex:
+    'Distinct displayed values of col, with the rows that have each, and the ASCII values containing each lowercase trigram.'
+    def __init__(self, col):
+        self.col = col
+        self.version = textVersion(col)
+        self.rows = col.sheet.rows
+        self.rowsByDisplay = {}  # [display] -> rowidx, or array of rowidxs if more than one
+        self.trigrams = {}       # [lowercase trigram] -> set of ASCII displays containing it
+        self.nonascii = []       # displays not in .trigrams, always candidates
+        self.done = False
+        self.build()
+
+    @asyncthread
+    def build(self):
+        rowsByDisplay = self.rowsByDisplay
+        getDisplayValue = self.col.getDisplayValue
+        for i, r in enumerate(Progress(self.rows, 'indexing')):
+            s = getDisplayValue(r)
+            k = rowsByDisplay.get(s)
+            if k is None:
+                rowsByDisplay[s] = i
+            elif type(k) is int:
+                rowsByDisplay[s] = array.array('L', (k, i))
+            else:
+                k.append(i)
+
+        for s in Progress(list(rowsByDisplay.keys()), 'indexing'):
+            if any(ord(ch) >= 128 for ch in s):  # case-insensitive regex might match different characters than lower()
+                self.nonascii.append(s)
+                continue
+            lower = s.lower()
+            for j in range(len(lower)-2):
+                self.trigrams.setdefault(lower[j:j+3], set()).add(s)
+
+        self.done = True
+
+    def matchingRows(self, regex):
+        'Return sorted list of rowidxs whose displayed value regex.search() matches.'
+        candidates = None
+        for t in requiredTrigrams(regex):
+            displays = self.trigrams.get(t, ())
+            candidates = set(displays) if candidates is None else candidates.intersection(displays)
+            if not candidates:
+                break
+
+        if candidates is None:
+            candidates = self.rowsByDisplay.keys()
+        else:
+            candidates = itertools.chain(candidates, self.nonascii)
+
+        rowidxs = []
+        for s in candidates:
+            if regex.search(s):
+                k = self.rowsByDisplay[s]
+                if type(k) is int:
+                    rowidxs.append(k)
+                else:
+                    rowidxs.extend(k)
+        rowidxs.sort()
+        return rowidxs
+
+
+def getTextIndex(col):
+    'Return the ColumnTextIndex of col, or None if not (yet) built.  Starts building a new one if out of date.'
+    sheet = col.sheet
+    if not options.search_index or not sheet or len(sheet.rows) < options.search_index:
+        return None
+
+    idx = textIndexes.get(col)
+    if idx and not idx.done:
+        return None
+
+    if not idx or idx.version != textVersion(col):
+        if sheet.currentThreads:  # wait until loaded
+            return None
+        idx = textIndexes[col] = ColumnTextIndex(col)
+        if not idx.done:
+            return None
+
+    return idx
+
+
+def indexedMatches(columns, regex):
+    'Return [col] -> sorted rowidxs with displayed values matching regex, or None if not all columns are indexed.'
+    indexes = [getTextIndex(c) for c in columns]  # start building all of them
+    if not all(indexes):
+        return None
+    return {c: idx.matchingRows(regex) for c, idx in zip(columns, indexes)}
+
+
+def nextIndexedMatch(sheet, columns, matches, backward=False):
+    'Return (rowidx, col) of the first match in matches after the cursor, in the order of rotate_range, or None.'
+    cursor = sheet.cursorRowIndex
+    found = None
+    for c in columns:
+        rowidxs = matches[c]
+        if not rowidxs:
+            continue
+        if backward:
+            i = bisect.bisect_left(rowidxs, cursor)
+            r = rowidxs[i-1] if i > 0 else rowidxs[-1]
+            dist = (cursor - r) % len(sheet.rows) or len(sheet.rows)
+        else:
+            i = bisect.bisect_right(rowidxs, cursor)
+            r = rowidxs[i] if i < len(rowidxs) else rowidxs[0]
+            dist = (r - cursor) % len(sheet.rows) or len(sheet.rows)
+        if found is None or dist < found[0]:  # earlier columns win ties
+            found = (dist, r, c)
+
+    if found:
+        dist, r, c = found
+        if (r >= cursor) if backward else (r <= cursor):
+            status('search wrapped')
+        return r, c
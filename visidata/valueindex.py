@@ -0,0 +1,276 @@
+'Hash index of the values of a column, for commands that look for rows with equal values.'
+
+import array
+import bisect
+import weakref
+
+from visidata import Sheet, Progress, TypedWrapper, asyncthread, fail
+
+valueIndexes = weakref.WeakKeyDictionary()  # [Column] -> {typed: ColumnValueIndex}
+
+
+def valueVersion(col):
+    'Anything the values of col and their row indexes depend on.'
+    sheet = col.sheet
+    return (col.epoch, sheet.epoch, id(sheet.rows), len(sheet.rows))
+
+
+def addRowIdx(d, k, i):
+    'Add rowidx i to d[k], a single rowidx or an array of them.'
+    v = d.get(k)
+    if v is None:
+        d[k] = i
+    elif type(v) is int:
+        d[k] = array.array('L', (v, i))
+    else:
+        v.append(i)
+
+
+class ColumnValueIndex:
+    'Row indexes of each distinct value of col, typed (getTypedValue) or raw (getValue).'
+    def __init__(self, col, typed):
+        self.version = valueVersion(col)
+        self.rows = col.sheet.rows
+        self.rowsByValue = {}    # [value] -> rowidx, or array of rowidxs if more than one
+        self.rowsByWrapped = {}  # [(type, val)] -> rowidxs of plain TypedWrapper values, which are equal by type and val (but hash by str(val))
+        self.errors = []         # rowidxs for which getting the value raised
+        self.get = col.getTypedValue if typed else col.getValue
+        self.hashable = True
+        self.done = False
+
+    def build(self):
+        try:
+            for i, r in enumerate(Progress(self.rows, 'indexing')):
+                try:
+                    v = self.get(r)
+                except Exception:
+                    self.errors.append(i)
+                    continue
+                if type(v) is TypedWrapper:
+                    addRowIdx(self.rowsByWrapped, (v.type, v.val), i)
+                else:
+                    addRowIdx(self.rowsByValue, v, i)
+        except TypeError:  # unhashable value
+            self.hashable = False
+            self.rowsByValue.clear()
+            self.rowsByWrapped.clear()
+        self.done = True
+
+    @asyncthread
+    def buildAsync(self):
+        self.build()
+
+    def rowidxs(self, value):
+        'Return sorted rowidxs of rows with values equal to value.'
+        if type(value) is TypedWrapper:
+            v = self.rowsByWrapped.get((value.type, value.val), [])
+        elif not isinstance(value, TypedWrapper) and value != value:  # like nan, equal to nothing
+            v = []
+        else:
+            v = self.rowsByValue.get(value, [])
+        return [v] if type(v) is int else list(v)
+
+
+def getValueIndex(col, typed=True, background=False):
+    'Return up-to-date ColumnValueIndex of col, building it now if needed (or if background, in a thread for next time); or None if not available.'
+    indexes = valueIndexes.setdefault(col, {})
+    idx = indexes.get(typed)
+    if idx and not idx.done:
+        return None
+
+    if not idx or idx.version != valueVersion(col):
+        if background and col.sheet.currentThreads:  # wait until loaded
+            return None
+        idx = indexes[typed] = ColumnValueIndex(col, typed)
+        if background:
+            idx.buildAsync()
+        else:
+            idx.build()
+        if not idx.done:
+            return None
+
+    return idx if idx.hashable else None
+
+
+def gatherByValue(sheet, col, value):
+    'Generate rows with typed values in col equal to value.'
+    idx = getValueIndex(col)
+    try:
+        rowidxs = idx.rowidxs(value) if idx else None
+    except TypeError:
+        rowidxs = None
+
+    if rowidxs is None:
+        yield from sheet.gatherBy(lambda r: col.getTypedValue(r) == value)
+    else:
+        yield from (idx.rows[i] for i in rowidxs)
+
+Sheet.gatherByValue = gatherByValue
+
+
+def gatherByRowValues(sheet, row, cols):
+    'Generate rows with the same typed values as row in all cols.  Only the cursor column (or the first of cols) is indexed; the rows with its value are then checked against the other cols.'
+    if not cols:
+        yield from sheet.rows
+        return
+
+    col = sheet.cursorCol if sheet.cursorCol in cols else cols[0]
+    idx = getValueIndex(col)
+    try:
+        rowidxs = idx.rowidxs(col.getTypedValue(row)) if idx else None
+    except TypeError:
+        rowidxs = None
+
+    if rowidxs is None:
+        yield from sheet.gatherBy(lambda r: all([c.getTypedValue(r) == c.getTypedValue(row) for c in cols]))
+        return
+
+    others = [(c, c.getTypedValue(row)) for c in cols if c is not col]
+    rows = idx.rows
+    for i in rowidxs:
+        r = rows[i]
+        if all(c.getTypedValue(r) == v for c, v in others):
+            yield r
+
+Sheet.gatherByRowValues = gatherByRowValues
+
+
+def moveToNextValue(sheet, col, reverse=False):
+    'Move cursor to next (prev if reverse) row with a raw value in col different from the cursor row.  Returns False if there is none.'
+    val = col.getValue(sheet.cursorRow)
+    idx = getValueIndex(col, typed=False, background=True)  # a short scan may be quicker than indexing now
+    try:
+        same = idx.rowidxs(val) if idx and val == val else None
+    except TypeError:
+        same = None
+
+    if same is not None and idx.errors:  # rows that raise are skipped too
+        same = sorted(same + idx.errors)
+
+    cursor = sheet.cursorRowIndex
+    j = bisect.bisect_left(same, cursor) if same else 0
+    if not same or j == len(same) or same[j] != cursor:
+        return sheet.moveToNextRow(lambda row: col.getValue(row) != val, reverse=reverse)
+
+    # the run of consecutive rowidxs in same through the cursor ends where same[j] - j changes
+    if reverse:
+        lo, hi = 0, j
+        while lo < hi:
+            mid = (lo+hi)//2
+            if cursor - same[mid] == j - mid:
+                hi = mid
+            else:
+                lo = mid+1
+        i = cursor - (j - lo) - 1
+        if i < 0:
+            return False
+    else:
+        lo, hi = j, len(same)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if same[mid] - cursor == mid - j:
+                lo = mid+1
+            else:
+                hi = mid
+        i = cursor + (lo - j)
+        if i >= len(sheet.rows):
+            return False
+
+    sheet.cursorRowIndex = i
+    return True
+
+Sheet.moveToNextValue = moveToNextValue
+
+
+def firstTrue(pred, lo, hi):
+    'Return the first i in range(lo, hi) for which pred(i) is true, given that pred is false and then true; or hi if it is never true.'
+    while lo < hi:
+        mid = (lo+hi)//2
+        if pred(mid):
+            hi = mid
+        else:
+            lo = mid+1
+    return lo
+
+
+def sortedKeyFunc(sheet, col):
+    'Return (func(rowidx) -> sort key, reverse) if rows are ordered by col (the first column of the last orderBy), else None.'
+    sortedBy = sheet.sortedBy
+    if not sortedBy or sortedBy[0][0] is not col:
+        return None
+    rows = sheet.rows
+    getter = col.getTypedValueNoExceptions  # as for the sort keys
+    return (lambda i: getter(rows[i])), sortedBy[1]
+
+
+def sortedRowRange(sheet, col, lo, hi):
+    'Return (start, end) rowidxs of the rows with lo <= typed value < hi (None for no bound), by bisection; or None if rows are not sorted by col.'
+    sortkey = sortedKeyFunc(sheet, col)
+    if not sortkey:
+        return None
+    key, reverse = sortkey
+    n = len(sheet.rows)
+    try:
+        # only key < bound, which also holds for nulls and errors (TypedWrapper), which sort first
+        if reverse:
+            start = firstTrue(lambda i: key(i) < hi, 0, n) if hi is not None else 0
+            end = firstTrue(lambda i: key(i) < lo, 0, n) if lo is not None else n
+        else:
+            start = firstTrue(lambda i: not key(i) < lo, 0, n) if lo is not None else 0
+            end = firstTrue(lambda i: not key(i) < hi, 0, n) if hi is not None else n
+    except TypeError:
+        return None
+    return start, max(start, end)
+
+
+def parseRange(col, s):
+    'Return (lo, hi) typed values of col from "lo..hi", either of which may be empty for no bound.'
+    lo, sep, hi = s.partition('..')
+    sep or fail('range must be lo..hi')
+    return (col.type(lo) if lo else None), (col.type(hi) if hi else None)
+
+
+def gatherByRange(sheet, col, lo, hi):
+    'Generate rows with typed values in col in the range lo <= value < hi (None for no bound).'
+    rng = sortedRowRange(sheet, col, lo, hi)
+    if rng is None:
+        yield from sheet.gatherBy(lambda r: (lo is None or not col.getTypedValue(r) < lo) and (hi is None or col.getTypedValue(r) < hi))
+    else:
+        yield from sheet.rows[rng[0]:rng[1]]
+
+Sheet.gatherByRange = gatherByRange
+
+
+def moveToValue(sheet, col, value):
+    'Move cursor to the first row with typed value in col equal to value; if rows are sorted by col and there is none, to where it would be.  Returns False if there is no such row.'
+    sortkey = sortedKeyFunc(sheet, col)
+    if sortkey:
+        key, reverse = sortkey
+        n = len(sheet.rows)
+        try:
+            if reverse:
+                end = firstTrue(lambda i: key(i) < value, 0, n)
+                i = firstTrue(lambda i: not value < key(i), 0, end)  # first of the run of equal values before end
+                found = i < end
+            else:
+                i = firstTrue(lambda i: not key(i) < value, 0, n)
+                found = i < n and not value < key(i)
+            sheet.cursorRowIndex = i
+            return found
+        except TypeError:
+            pass
+
+    idx = getValueIndex(col)
+    try:
+        rowidxs = idx.rowidxs(value) if idx else None
+    except TypeError:
+        rowidxs = None
+    if rowidxs is None:
+        rowidxs = (i for i, r in enumerate(sheet.rows) if col.getTypedValue(r) == value)
+
+    for i in rowidxs:
+        sheet.cursorRowIndex = i
+        return True
+    return False
+
+Sheet.moveToValue = moveToValue
@@ -53,6 +53,14 @@ import traceback
 import time
 import inspect
 import weakref
+import array
+import heapq
+import operator
+import pickle
+import tempfile
+import dis
+import ast
+import builtins
 
 class EscapeException(BaseException):
     'Inherits from BaseException to avoid "except Exception" clauses.  Do not use a blanket "except:" or the task will be uncancelable.'
@@ -166,6 +174,7 @@ class OptionsObject:
     def __init__(self, mgr):
         object.__setattr__(self, '_opts', mgr)
         object.__setattr__(self, '_cache', {})
+        object.__setattr__(self, '_epoch', 0)  # incremented on any set()
 
     def keys(self, obj=None):
         for k, d in self._opts.items():
@@ -182,6 +191,7 @@ class OptionsObject:
 
     def _set(self, k, v, obj=None, helpstr=''):
         self._cache.clear()  # invalidate entire cache on any set()
+        object.__setattr__(self, '_epoch', self._epoch+1)
         return self._opts.set(k, Option(k, v, helpstr), obj)
 
     def get(self, k, obj=None):
@@ -272,6 +282,10 @@ replayableOption('null_value', None, 'a value to be counted as null')
 replayableOption('force_valid_colnames', False, 'clean column names to be valid Python identifiers')
 option('debug', False, 'exit on error and display stacktrace')
 option('curses_timeout', 100, 'curses timeout in ms')
+option('draw_cache', True, 'redraw only cells that changed since the previous draw')
+option('sort_max_mem', 0.0, 'max MB of sort keys to keep in memory; larger sorts are merged from temp files (0 for no limit)')
+option('sort_progressive', 100000, 'when sorting at least this many rows, show the first screenful before the full sort is done (0 to disable)')
+option('expr_numpy', True, 'evaluate arithmetic expressions on numeric columns over whole columns at once with numpy (if installed)')
 theme('force_256_colors', False, 'use 256 colors even if curses reports fewer')
 theme('use_default_colors', False, 'curses use default terminal colors')
 
@@ -324,7 +338,7 @@ globalCommand('KEY_RESIZE', 'no-op', '')
 globalCommand('q', 'quit-sheet',  'vd.sheets[1:] or options.quitguard and confirm("quit last sheet? "); vd.sheets.pop(0)')
 globalCommand('gq', 'quit-all', 'vd.sheets.clear()')
 
-globalCommand('^L', 'redraw', 'vd.scr.clear()')
+globalCommand('^L', 'redraw', 'vd.redraw()')
 globalCommand('^^', 'prev-sheet', 'vd.sheets[1:] or fail("no previous sheet"); vd.sheets[0], vd.sheets[1] = vd.sheets[1], vd.sheets[0]')
 
 globalCommand('^Z', 'suspend', 'suspend()')
@@ -387,9 +401,20 @@ vdtype(len, '♯', '{:.0f}')
 vdtype(dict, '')
 vdtype(list, '')
 
+# [typetype] -> array typecode of Column.materialize() buffer (None for a list); other types are not materialized
+materializedTypes = {int: 'q', float: 'd'}
+
 def isNumeric(col):
     return col.type in (int,len,float,currency,date)
 
+# [typetype] -> raw value types eligible for Column.getCellRenderer fast path
+_fastCellTypes = {
+    anytype: (str,),
+    str: (str,),
+    int: (str, int, float),
+    float: (str, int, float),
+}
+
 ###
 
 def catchapply(func, *args, **kwargs):
@@ -536,6 +561,41 @@ class Progress:
                 yield item
                 self.made += 1
 
+def unpickleAll(fp):
+    'Generate all items of the lists pickled one after another into fp.'
+    while True:
+        try:
+            yield from pickle.load(fp)
+        except EOFError:
+            return
+
+class _WrappedKey:
+    'Sort key for TypedWrapper values: before all other values, errors before nulls, and otherwise equal, so that sorting in memory and merging sorted temp files give the same order.'
+    __slots__ = ['rank']
+    def __init__(self, rank):
+        self.rank = rank
+    def __eq__(self, other):
+        return isinstance(other, _WrappedKey) and self.rank == other.rank
+    def __lt__(self, other):
+        return not isinstance(other, _WrappedKey) or self.rank < other.rank
+    def __gt__(self, other):
+        return isinstance(other, _WrappedKey) and self.rank > other.rank
+    def __hash__(self):
+        return self.rank
+
+def _wrappedKey(v):
+    return _WrappedKey(0 if isinstance(v, TypedExceptionWrapper) else 1)
+
+class _Descending:
+    'Sort key that orders before another when its key is greater.'
+    __slots__ = ['key']
+    def __init__(self, key):
+        self.key = key
+    def __eq__(self, other):
+        return self.key == other.key
+    def __lt__(self, other):
+        return other.key < self.key
+
 @asyncthread
 def _async_deepcopy(vs, newlist, oldlist):
     for r in Progress(oldlist, 'copying'):
@@ -564,6 +624,7 @@ class VisiData:
         self.inInput = False
         self.prefixWaiting = False
         self.scr = None  # curses scr
+        self.drawEpoch = 0  # incremented when the screen no longer shows what the top sheet last drew
         self.hooks = collections.defaultdict(list)  # [hookname] -> list(hooks)
         self.mousereg = []
         self.threads = [] # all long-running threads, including main and finished
@@ -623,17 +684,15 @@ class VisiData:
         t.exception = None
         self.threads.append(t)
 
-    def execAsync(self, func, *args, **kwargs):
-        'Execute `func(*args, **kwargs)` in a separate thread.'
+    def execAsync(self, func, *args, sheet=None, **kwargs):
+        'Execute `func(*args, **kwargs)` in a separate thread, as one of the currentThreads of `sheet` (by default the top sheet).'
 
         thread = threading.Thread(target=self.toplevelTryFunc, daemon=True, args=(func,)+args, kwargs=kwargs)
         self.addThread(thread)
 
-        if self.sheets:
-            currentSheet = self.sheets[0]
+        currentSheet = sheet or (self.sheets[0] if self.sheets else None)
+        if currentSheet:
             currentSheet.currentThreads.append(thread)
-        else:
-            currentSheet = None
 
         thread.sheet = currentSheet
         thread.start()
@@ -678,6 +737,11 @@ class VisiData:
             time.sleep(.3)
             self.checkForFinishedThreads()
 
+    def redraw(self):
+        'Clear the screen and force a full redraw.'
+        self.scr.clear()
+        self.drawEpoch += 1
+
     def refresh(self):
         Sheet.visibleCols.fget.cache_clear()
         Sheet.keyCols.fget.cache_clear()
@@ -690,6 +754,7 @@ class VisiData:
         if not v or v[0] is None:
             with EnableCursor():
                 v = editText(self.scr, y, x, w, **kwargs)
+            self.drawEpoch += 1  # edit field was drawn over the sheet
         else:
             v = v[0]
 
@@ -847,6 +912,7 @@ class VisiData:
         numTimeouts = 0
 
         self.keystrokes = ''
+        drawnSheet = None
         while True:
             if not self.sheets:
                 # if no more sheets, exit
@@ -855,6 +921,10 @@ class VisiData:
             sheet = self.sheets[0]
             threading.current_thread().sheet = sheet
 
+            if sheet is not drawnSheet:  # another sheet was drawn over this one
+                self.drawEpoch += 1
+                drawnSheet = sheet
+
             try:
                 sheet.draw(scr)
             except Exception as e:
@@ -1022,6 +1092,9 @@ class CompleteKey:
 # coloropt is the color option name (like 'color_error')
 # func(sheet,col,row,value) should return a true value if coloropt should be applied
 # if coloropt is None, func() should return a coloropt (or None) instead
+# the kind of Colorizer declares what func depends on, besides the sheet:
+#   RowColorizer only on row, ColumnColorizer only on col, CellColorizer on any of col/row/value
+# Sheet.colorize calls Row/ColumnColorizers once per row/column per draw.
 RowColorizer = collections.namedtuple('RowColorizer', 'precedence coloropt func')
 CellColorizer = collections.namedtuple('CellColorizer', 'precedence coloropt func')
 ColumnColorizer = collections.namedtuple('ColumnColorizer', 'precedence coloropt func')
@@ -1244,13 +1317,20 @@ class Sheet(BaseSheet):
         # as computed during draw()
         self.rowLayout = {}      # [rowidx] -> y
         self.visibleColLayout = {}      # [vcolidx] -> (x, w)
+        self._drawState = None   # everything else the previous draw depended on
+        self._drawnCells = {}    # [(y, vcolidx)] -> key of cell drawn there
+        self._colorMemo = {}     # colorstacks and attrs, cleared at start of each draw()
+
+        self.epoch = 0  # incremented whenever rows or column values change, including rows moving to other indexes
 
         # list of all columns in display order
         self.columns = kwargs.get('columns') or [copy(c) for c in self.columns] or [Column('')]
         self.recalc()  # set .sheet on columns and start caches
 
         self.setKeys(self.columns[:self.nKeys])  # initial list of key columns
-        self._selectedRows = {}  # id(row) -> row
+        self._selection = RowSelection()
+        self._compiledExprs = {}  # [expr] -> (version, func(row)) from compileExpr
+        self._sortedBy = (None, None, None)  # (sortedBy, rows, sortedVersion) as of last orderBy
 
         self.__dict__.update(kwargs)  # also done earlier in BaseSheet.__init__
 
@@ -1266,6 +1346,8 @@ class Sheet(BaseSheet):
 
     def addColorizer(self, c):
         self.colorizers.append(c)
+        Sheet.getColorizers.cache_clear()
+        Sheet.getColorizersByKind.cache_clear()
 
     @functools.lru_cache()
     def getColorizers(self):
@@ -1280,27 +1362,61 @@ class Sheet(BaseSheet):
                 _colorizers.add(c)
         return sorted(_colorizers, key=lambda x: x.precedence, reverse=True)
 
-    def colorize(self, col, row, value=None):
-        'Returns curses attribute for the given col/row/value'
-
-#        colorstack = tuple(c.coloropt for c in self.getColorizers() if wrapply(c.func, self, col, row, value))
+    @functools.lru_cache()
+    def getColorizersByKind(self):
+        'Return (rowColorizers, colColorizers, cellColorizers), each a list of (precedence rank, Colorizer).'
+        kinds = (RowColorizer, ColumnColorizer, CellColorizer)
+        ret = tuple([] for k in kinds)
+        for i, c in enumerate(self.getColorizers()):
+            ret[kinds.index(type(c)) if type(c) in kinds else 2].append((i, c))
+        return ret
 
+    def _colorstack(self, colorizers, col, row, value):
+        'Return tuple of (rank, coloropt) for the given colorizers which apply to col/row/value.'
         colorstack = []
-        for colorizer in self.getColorizers():
+        for i, colorizer in colorizers:
             try:
                 r = colorizer.func(self, col, row, value)
                 if r:
-                    colorstack.append(colorizer.coloropt if colorizer.coloropt else r)
+                    colorstack.append((i, colorizer.coloropt if colorizer.coloropt else r))
             except Exception as e:
                 exceptionCaught(e)
+        return tuple(colorstack)
+
+    def colorize(self, col, row, value=None):
+        'Returns curses attribute for the given col/row/value.  Row and column colorizers are evaluated once per row/column per draw.'
+        rowcolorizers, colcolorizers, cellcolorizers = self.getColorizersByKind()
+        memo = self._colorMemo
+
+        k = (RowColorizer, id(row))
+        rowstack = memo.get(k)
+        if rowstack is None:
+            rowstack = memo[k] = self._colorstack(rowcolorizers, col, row, value)
+
+        k = (ColumnColorizer, id(col))
+        colstack = memo.get(k)
+        if colstack is None:
+            colstack = memo[k] = self._colorstack(colcolorizers, col, row, value)
+
+        cellstack = self._colorstack(cellcolorizers, col, row, value)
+
+        k = (rowstack, colstack, cellstack)
+        attr = memo.get(k)
+        if attr is None:
+            colorstack = tuple(coloropt for i, coloropt in sorted(rowstack+colstack+cellstack, key=lambda x: x[0]))
+            attr = memo[k] = colors.resolve_colors(colorstack)
+        return attr
 
-        return colors.resolve_colors(tuple(colorstack))
+    def bumpEpoch(self):
+        'Invalidate anything derived from the rows or column values of this sheet (like drawn cells).'
+        self.epoch += 1
 
     def addRow(self, row, index=None):
         if index is None:
             self.rows.append(row)
         else:
             self.rows.insert(index, row)
+            self.bumpEpoch()  # rows after index moved
         return row
 
     def column(self, colregex):
@@ -1335,8 +1451,12 @@ class Sheet(BaseSheet):
         ret.setKeys(ret.columns)
         ret.columns.extend(copy(c) for c in self.columns if c not in self.keyCols)
         ret.recalc()  # set .sheet on columns
-        ret._selectedRows = {}
+        ret._selection = RowSelection()
         ret.topRowIndex = ret.cursorRowIndex = 0
+        ret._drawState = None
+        ret._drawnCells = {}
+        ret._colorMemo = {}
+        ret._compiledExprs = {}
         ret.progresses = []
         ret.currentThreads = []
         ret.precious = True  # copies can be precious even if originals aren't
@@ -1350,42 +1470,57 @@ class Sheet(BaseSheet):
 
     def deleteBy(self, func):
         'Delete rows for which func(row) is true.  Returns number of deleted rows.'
-        oldrows = copy(self.rows)
-        oldidx = self.cursorRowIndex
-        ndeleted = 0
-
-        row = None   # row to re-place cursor after
-        while oldidx < len(oldrows):
-            if not func(oldrows[oldidx]):
-                row = self.rows[oldidx]
-                break
-            oldidx += 1
-
-        self.rows.clear()
-        for r in Progress(oldrows, 'deleting'):
-            if not func(r):
-                self.rows.append(r)
-                if r is row:
-                    self.cursorRowIndex = len(self.rows)-1
-            else:
-                ndeleted += 1
-
+        flags = bytearray(1 if func(r) else 0 for r in Progress(self.rows, 'checking'))
+        return self.deleteByFlags(flags)
+
+    def deleteByFlags(self, flags):
+        'Delete rows whose flag is 1 (flags is a bytearray of 0/1 per row, like selectedFlags), compacting self.rows in place.  Returns number of deleted rows.'
+        rows = self.rows
+        n = len(flags)
+        ndeleted = flags.count(1)
+
+        # re-place cursor on the first row at or after it that is not deleted
+        cursoridx = flags.find(0, self.cursorRowIndex)
+        if cursoridx >= 0:
+            self.cursorRowIndex = cursoridx - flags.count(1, 0, cursoridx)
+
+        # move each run of kept rows down over the deleted ones; rows before the first deleted row stay put
+        j = flags.find(1)
+        i = j
+        with Progress(total=n, gerund='deleting') as prog:
+            while 0 <= i < n:
+                i = flags.find(0, i)
+                if i < 0:
+                    break
+                end = flags.find(1, i)
+                if end < 0:
+                    end = n
+                while i < end:  # in chunks, to copy only so many row references at once
+                    k = min(end, i+65536)
+                    rows[j:j+k-i] = rows[i:k]
+                    j += k-i
+                    prog.addProgress(k-i)
+                    i = k
+            if j >= 0:
+                del rows[j:n]  # any rows after n (added meanwhile) are kept
+
+        self.bumpEpoch()
         status('deleted %s %s' % (ndeleted, self.rowtype))
         return ndeleted
 
     @asyncthread
     def deleteSelected(self):
         'Delete all selected rows.'
-        ndeleted = self.deleteBy(self.isSelected)
-        nselected = len(self._selectedRows)
-        self._selectedRows.clear()
+        nselected = self.nSelected
+        ndeleted = self.deleteByFlags(self.selectedFlags)
+        self.clearSelected()
         if ndeleted != nselected:
             error('expected %s' % nselected)
 
     @asyncthread
     def delete(self, rows):
-        rowdict = {id(r): r for r in rows}
-        ndeleted = self.deleteBy(lambda r,rowdict=rowdict: id(r) in rowdict)
+        ids = set(map(id, rows))
+        ndeleted = self.deleteByFlags(bytearray(map(ids.__contains__, map(id, self.rows))))
         nrows = len(rows)
         if ndeleted != nrows:
             error('expected %s' % nrows)
@@ -1394,7 +1529,118 @@ class Sheet(BaseSheet):
         return self.name
 
     def evalexpr(self, expr, row=None):
-        return eval(expr, getGlobals(), LazyMapRow(self, row) if row is not None else None)
+        if row is None:
+            return eval(expr, getGlobals(), None)
+        return self.compileExpr(expr)(row)
+
+    def compileExpr(self, expr):
+        'Return func(row) to evaluate expr (str or code object), with the column names in expr resolved once.  Cached until columns change.'
+        version = (self.epoch, len(self.columns))
+        cached = self._compiledExprs.get(expr)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        code = compile(expr, '<expr>', 'eval') if isinstance(expr, str) else expr
+
+        # only names loaded at the top level of expr can come from the row; the first column with that name wins, like LazyMapRow
+        names = set(instr.argval for instr in dis.get_instructions(code) if instr.opname == 'LOAD_NAME')
+        getters = {}  # [name] -> col.getTypedValue
+        for c in self.columns:
+            if c.name in names and c.name not in getters:
+                getters[c.name] = c.getTypedValue
+        rowNames = [k for k in ('row', '__row__') if k in names and k not in getters]
+        consts = {k: self for k in ('sheet', '__sheet__') if k in names and k not in getters}
+        getters = list(getters.items())
+        glbls = getGlobals()
+
+        def evalrow(row):
+            d = {k: get(row) for k, get in getters}
+            for k in rowNames:
+                d[k] = row
+            if consts:
+                d.update(consts)
+            return eval(code, glbls, d)
+
+        self._compiledExprs[expr] = (version, evalrow)
+        return evalrow
+
+    def vectorizeExpr(self, expr):
+        'Return (code, cols, funcs) to evaluate expr over numpy arrays of cols, or None if numpy is not installed or expr is not float arithmetic or comparison of numeric columns.'
+        if not options.expr_numpy or not isinstance(expr, str):
+            return None
+        try:
+            import numpy
+            tree = ast.parse(expr, mode='eval')
+        except (ImportError, SyntaxError):
+            return None
+
+        colsByName = {}
+        for c in self.columns:
+            colsByName.setdefault(c.name, c)
+        glbls = getGlobals()
+        cols = {}   # [name] -> Column
+        funcs = {}  # [name] -> numpy ufunc
+
+        def vtype(node):
+            'Return the type (int, float, bool) of node evaluated for one row; raise ValueError if numpy would not give the same result.'
+            nodetype = type(node).__name__
+            if nodetype in ('Constant', 'Num'):
+                v = getattr(node, 'value', getattr(node, 'n', None))
+                if type(v) not in (int, float, bool):
+                    raise ValueError(v)
+                return type(v)
+            if isinstance(node, ast.Name):
+                c = colsByName.get(node.id)
+                if c is None or materializedTypes.get(c.type) not in ('q', 'd'):
+                    raise ValueError(node.id)
+                cols[node.id] = c
+                return int if materializedTypes[c.type] == 'q' else float
+            if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+                return vtype(node.operand)
+            if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)):
+                left, right = vtype(node.left), vtype(node.right)
+                if isinstance(node.op, ast.Div) or float in (left, right):
+                    return float
+                return int
+            if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)):
+                vtype(node.left)
+                vtype(node.comparators[0])
+                return bool
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1 and not node.keywords:
+                name = node.func.id
+                func = glbls.get(name, getattr(builtins, name, None))
+                npname = _numpyFuncs.get(name)
+                if not npname or name in colsByName or getattr(func, '__module__', None) not in ('math', 'builtins') or func.__name__ != name:
+                    raise ValueError(name)
+                argtype = vtype(node.args[0])
+                funcs[name] = getattr(numpy, npname)
+                return argtype if name == 'abs' else float
+            raise ValueError(nodetype)
+
+        try:
+            if vtype(tree.body) not in (float, bool) or not cols:  # int results might overflow or lose precision as float64
+                return None
+        except (ValueError, TypeError):
+            return None
+
+        return compile(tree, '<expr>', 'eval'), cols, funcs
+
+    def evalexprVector(self, expr, rows):
+        'Return list of values of expr for each of rows, computed at once with numpy; or None if expr cannot be vectorized or fails, to evaluate it per row instead.'
+        vexpr = self.vectorizeExpr(expr)
+        if not vexpr:
+            return None
+
+        import numpy
+        code, cols, funcs = vexpr
+        try:
+            localvars = {name: numpyValues(c, rows) for name, c in cols.items()}
+            localvars.update(funcs)
+            with numpy.errstate(all='raise'):  # like ZeroDivisionError and ValueError from math per row
+                ret = eval(code, {'__builtins__': {}}, localvars)
+            return ret.tolist()
+        except Exception:
+            return None
 
     def inputExpr(self, prompt, *args, **kwargs):
         return input(prompt, "expr", *args, completer=CompleteExpr(self), **kwargs)
@@ -1475,7 +1721,7 @@ class Sheet(BaseSheet):
     @property
     def statusLine(self):
         'String of row and column stats.'
-        rowinfo = 'row %d/%d (%d selected)' % (self.cursorRowIndex, self.nRows, len(self._selectedRows))
+        rowinfo = 'row %d/%d (%d selected)' % (self.cursorRowIndex, self.nRows, self.nSelected)
         colinfo = 'col %d/%d (%d visible)' % (self.cursorColIndex, self.nCols, len(self.visibleCols))
         return '%s  %s' % (rowinfo, colinfo)
 
@@ -1496,51 +1742,70 @@ class Sheet(BaseSheet):
 
 ## selection code
     def isSelected(self, row):
-        'True if given row is selected. O(log n).'
-        return id(row) in self._selectedRows
+        'True if given row is selected. O(1) for the cursor row and rows looked up in order.'
+        return self._selection.isSelected(row, self.cursorRowIndex)
+
+    @property
+    def nSelected(self):
+        'Number of selected rows. O(1)'
+        return self._selection.count
+
+    def _bulkSelectable(self):
+        'True if selectRow/unselectRow are not overridden, so bulk selection can skip them.'
+        cls = type(self)
+        return cls.selectRow is Sheet.selectRow and cls.unselectRow is Sheet.unselectRow
 
     @asyncthread
     def toggle(self, rows):
         'Toggle selection of given `rows`.'
+        if self._bulkSelectable():
+            self._selection.setRows(self.rows, rows, operator.xor)
+            return
         for r in Progress(rows, 'toggling', total=len(self.rows)):
             if not self.unselectRow(r):
                 self.selectRow(r)
 
     def selectRow(self, row):
-        'Select given row. O(log n)'
-        self._selectedRows[id(row)] = row
+        'Select given row. O(1) (see isSelected)'
+        self._selection.set(self.rows, row, 1, self.cursorRowIndex)
 
     def unselectRow(self, row):
-        'Unselect given row, return True if selected; else return False. O(log n)'
-        if id(row) in self._selectedRows:
-            del self._selectedRows[id(row)]
-            return True
-        else:
-            return False
+        'Unselect given row, return True if selected; else return False. O(1) (see isSelected)'
+        return self._selection.set(self.rows, row, 0, self.cursorRowIndex)
+
+    def clearSelected(self):
+        'Unselect all rows. O(1)'
+        self._selection.clear()
 
     @asyncthread
     def select(self, rows, status=True, progress=True):
         "Bulk select given rows. Don't show progress if progress=False; don't show status if status=False."
-        before = len(self._selectedRows)
+        before = self.nSelected
         if options.bulk_select_clear:
-            self._selectedRows.clear()
-        for r in (Progress(rows, 'selecting') if progress else rows):
-            self.selectRow(r)
+            self.clearSelected()
+        if self._bulkSelectable():
+            self._selection.setRows(self.rows, rows, operator.or_)
+        else:
+            for r in (Progress(rows, 'selecting') if progress else rows):
+                self.selectRow(r)
         if status:
             if options.bulk_select_clear:
-                msg = 'selected %s %s%s' % (len(self._selectedRows), self.rowtype, ' instead' if before > 0 else '')
+                msg = 'selected %s %s%s' % (self.nSelected, self.rowtype, ' instead' if before > 0 else '')
             else:
-                msg = 'selected %s%s %s' % (len(self._selectedRows)-before, ' more' if before > 0 else '', self.rowtype)
+                msg = 'selected %s%s %s' % (self.nSelected-before, ' more' if before > 0 else '', self.rowtype)
             vd.status(msg)
 
     @asyncthread
     def unselect(self, rows, status=True, progress=True):
         "Unselect given rows. Don't show progress if progress=False; don't show status if status=False."
-        before = len(self._selectedRows)
-        for r in (Progress(rows, 'unselecting') if progress else rows):
-            self.unselectRow(r)
+        before = self.nSelected
+        if self._bulkSelectable():
+            self._selection.setRows(self.rows, rows, lambda a, b: a & ~b)
+        else:
+            for r in (Progress(rows, 'unselecting') if progress else rows):
+                self.unselectRow(r)
         if status:
-            vd().status('unselected %s/%s %s' % (before-len(self._selectedRows), before, self.rowtype))
+            vd().status('unselected %s/%s %s' % (before-self.nSelected, before, self.rowtype))
 
     def selectByIdx(self, rowIdxs):
         'Select given row indexes, without progress bar.'
@@ -1550,6 +1815,14 @@ class Sheet(BaseSheet):
         'Unselect given row indexes, without progress bar.'
         self.unselect((self.rows[i] for i in rowIdxs), progress=False)
 
+    def gatherByExpr(self, expr):
+        'Generate only rows for which expr is true.'
+        values = self.evalexprVector(expr, self.rows)
+        if values is None:
+            yield from self.gatherBy(self.compileExpr(expr))
+        else:
+            yield from itertools.compress(self.rows, values)
+
     def gatherBy(self, func):
         'Generate only rows for which the given func returns True.'
         for i in rotate_range(len(self.rows), self.cursorRowIndex):
@@ -1562,20 +1835,140 @@ class Sheet(BaseSheet):
 
     @asyncthread
     def orderBy(self, *cols, **kwargs):
+        'Stable sort of rows by the typed values of cols.  Keys are computed once per row first, then the row order is sorted by key.'
+        rows = list(self.rows)
+        sortedBy = None
         try:
-            with Progress(self.rows, 'sorting') as prog:
-                # must not reassign self.rows: use .sort() instead of sorted()
-                self.rows.sort(key=lambda r,cols=cols,prog=prog: prog.addProgress(1) and tuple(c.getTypedValueNoExceptions(r) for c in cols), **kwargs)
+            chunkrows = self.sortChunkRows(cols, rows)
+            if chunkrows < len(rows):
+                try:
+                    self.reorderRows(rows, self.sortOrderExternal(cols, rows, chunkrows, **kwargs), range(len(rows)))
+                    sortedBy = (cols, bool(kwargs.get('reverse')))
+                    return
+                except pickle.PicklingError as e:
+                    status('cannot sort with temp files (%s); sorting in memory' % e)
+
+            keys = self.sortKeys(cols, rows)
+            order = range(len(rows))  # order of rows in self.rows, as indexes into rows
+
+            nprogressive = options.sort_progressive
+            if nprogressive and len(rows) >= nprogressive:
+                # heap-select the top screenful and show it while the full sort runs
+                select = heapq.nlargest if kwargs.get('reverse') else heapq.nsmallest
+                top = select(max(self.nVisibleRows, 1), range(len(rows)), key=keys.__getitem__)
+                intop = set(top)
+                prevorder, order = order, top + [i for i in range(len(rows)) if i not in intop]
+                self.reorderRows(rows, order, prevorder)
+
+            with Progress(total=len(rows), gerund='sorting') as prog:
+                prevorder, order = order, sorted(range(len(rows)), key=keys.__getitem__, **kwargs)
+                prog.addProgress(len(rows))
+
+            self.reorderRows(rows, order, prevorder)
+            sortedBy = (cols, bool(kwargs.get('reverse')))
         except TypeError as e:
             status('sort incomplete due to TypeError; change column type')
             exceptionCaught(e, status=False)
+        finally:
+            self.bumpEpoch()
+            if len(self.rows) != len(rows):  # rows added meanwhile are not sorted
+                sortedBy = None
+            self._sortedBy = (sortedBy, self.rows, self.sortedVersion())
+
+    def sortedVersion(self):
+        'Anything the order of rows from orderBy depends on, besides which list .rows is.'
+        return (self.epoch, len(self.rows))
+
+    @property
+    def sortedBy(self):
+        '(cols, reverse) of the last orderBy, or None if rows or values have changed since.'
+        sortedBy, rows, version = self._sortedBy
+        if rows is self.rows and version == self.sortedVersion():
+            return sortedBy
+        self._sortedBy = (None, None, None)  # not keeping replaced rows alive
+
+    def sortChunkRows(self, cols, rows):
+        'Return how many rows of sort keys fit in options.sort_max_mem, estimated from the first rows.'
+        maxmem = options.sort_max_mem
+        if not maxmem or not rows:
+            return len(rows)
+
+        sample = self.sortKeys(cols, rows[:1000])
+        nbytes = sum(sys.getsizeof(k) + sum(map(sys.getsizeof, k)) for k in sample)/len(sample)
+        nbytes += 100  # (key, rowidx) tuple, list slot, and sort overhead
+        return max(int(maxmem*1024*1024/nbytes), 1000)
+
+    def sortOrderExternal(self, cols, rows, chunkrows, reverse=False):
+        'Return sorted order of rows (as indexes into rows), by sorting chunks of (key, rowidx) pairs, spilling them to temp files, and merging those.'
+        firstkey = operator.itemgetter(0)
+        files = []
+        try:
+            for start in range(0, len(rows), chunkrows):
+                chunk = rows[start:start+chunkrows]
+                pairs = list(zip(self.sortKeys(cols, chunk), range(start, start+len(chunk))))
+                del chunk
+                pairs.sort(key=firstkey, reverse=reverse)
+
+                fp = tempfile.TemporaryFile()
+                files.append(fp)
+                for i in range(0, len(pairs), 1000):
+                    try:
+                        pickle.dump(pairs[i:i+1000], fp, pickle.HIGHEST_PROTOCOL)
+                    except (AttributeError, TypeError) as e:  # some objects raise these instead
+                        raise pickle.PicklingError(str(e))
+                fp.seek(0)
+
+            # heapq.merge has no key= or reverse= before Python 3.5, so merge the pairs themselves;
+            # equal keys are then ordered by rowidx, as a stable sort would
+            chunks = [unpickleAll(fp) for fp in files]
+            if reverse:
+                chunks = [((_Descending(key), rowidx) for key, rowidx in chunk) for chunk in chunks]
+
+            order = []
+            with Progress(total=len(rows), gerund='merging') as prog:
+                for key, rowidx in heapq.merge(*chunks):
+                    order.append(rowidx)
+                    prog.addProgress(1)
+            return order
+        finally:
+            for fp in files:
+                fp.close()
+
+    def reorderRows(self, rows, order, prevorder):
+        'Put rows in order (indexes into rows) from prevorder, keeping the cursor on the same row.'
+        try:
+            cursoridx = prevorder[self.cursorRowIndex]
+        except IndexError:
+            cursoridx = None
+
+        # must not reassign self.rows; any rows added meanwhile stay at the end
+        self.rows[:len(rows)] = [rows[i] for i in order]
+
+        if cursoridx is not None:
+            self.cursorRowIndex = order.index(cursoridx)
+
+    def sortKeys(self, cols, rows):
+        'Return list of key tuples for each of rows.  TypedWrapper values order before all others: errors, then nulls, each in row order.'
+        getters = [c.getTypedValueNoExceptions for c in cols]
+        keys = []
+        for r in Progress(rows, 'computing sort keys'):
+            key = tuple(getter(r) for getter in getters)
+            if any(isinstance(v, TypedWrapper) for v in key):  # a TypedWrapper is less than anything, even another TypedWrapper
+                key = tuple(_wrappedKey(v) if isinstance(v, TypedWrapper) else v for v in key)
+            keys.append(key)
+        return keys
 
     @property
     def selectedRows(self):
-        'List of selected rows in sheet order. [O(nRows*log(nSelected))]'
-        if len(self._selectedRows) <= 1:
-            return list(self._selectedRows.values())
-        return [r for r in self.rows if id(r) in self._selectedRows]
+        'List of selected rows in sheet order. [O(nRows)]'
+        if not self.nSelected:
+            return []
+        return list(itertools.compress(self.rows, self.selectedFlags))
+
+    @property
+    def selectedFlags(self):
+        'bytearray with 1 for each selected row and 0 for each other row, in sheet order. [O(nRows) if rows changed since last time]'
+        return self._selection.sync(self.rows)
 
 ## end selection code
 
@@ -1630,19 +2023,23 @@ class Sheet(BaseSheet):
                 index = len(self.columns)
             col.sheet = self
             self.columns.insert(index, col)
+            self.bumpEpoch()
             return col
 
     def setKeys(self, cols):
         for col in cols:
             col.keycol = True
+        self.bumpEpoch()
 
     def unsetKeys(self, cols):
         for col in cols:
             col.keycol = False
+        self.bumpEpoch()
 
     def toggleKeys(self, cols):
         for col in cols:
             col.keycol = not col.keycol
+        self.bumpEpoch()
 
     def rowkey(self, row):
         'returns a tuple of the key for the given row'
@@ -1763,26 +2160,47 @@ class Sheet(BaseSheet):
         return self.visibleCols[vcolidx] in self.keyCols
 
     def draw(self, scr):
-        'Draw entire screen onto the `scr` curses object.'
+        'Draw entire screen onto the `scr` curses object.  Only cells whose displayed value or drawn state changed since the last draw are redrawn.'
         numHeaderRows = 1
-        scr.erase()  # clear screen before every re-draw
 
         vd().refresh()
 
+        self.calcColLayout()
+        nrows = max(0, min(self.nVisibleRows, self.nRows-self.topRowIndex))
+
+        # anything in here changing means the previous draw is no longer on screen as-is
+        drawState = (vd.drawEpoch, options._epoch, self.epoch, scr.getmaxyx(), self.topRowIndex, nrows,
+                        tuple(sorted((k, tuple(v)) for k, v in self.visibleColLayout.items())), len(vd.unfinishedThreads))
+
+        if not options.draw_cache or self.currentThreads or drawState != self._drawState:
+            scr.erase()  # clear screen and redraw every cell
+            self._drawnCells.clear()
+            self._drawState = drawState
+
+        self._colorMemo.clear()  # selection, cursor etc may have changed since last draw
+
         if not self.columns:
             return
 
         color_current_row = CursesAttr(colors.color_current_row, 5)
         disp_column_sep = options.disp_column_sep
+        disp_keycol_sep = options.disp_keycol_sep
+        disp_note_none = options.disp_note_none
+        drawnCells = self._drawnCells  # [(y, vcolidx)] -> cellkey of what was drawn there
 
         rowattrs = {}  # [rowidx] -> attr
         colattrs = {}  # [colidx] -> attr
         isNull = isNullFunc()
 
         self.rowLayout = {}
-        self.calcColLayout()
         vcolidx = 0
-        rows = list(self.rows[self.topRowIndex:self.topRowIndex+self.nVisibleRows])
+        rows = list(self.rows[self.topRowIndex:self.topRowIndex+nrows])
+        selection = self._selection
+        selection.syncRange(self.rows, self.topRowIndex, self.topRowIndex+nrows)  # so isSelected can find rows by position
+        try:
+            cursorCol = self.cursorCol
+        except IndexError:
+            cursorCol = None
         for vcolidx, colinfo in sorted(self.visibleColLayout.items()):
             x, colwidth = colinfo
             col = self.visibleCols[vcolidx]
@@ -1791,23 +2209,36 @@ class Sheet(BaseSheet):
                 headerRow = 0
                 self.drawColHeader(scr, headerRow, vcolidx)
 
+                getCell = col.getCellRenderer(colwidth-1)  # chosen once per column per draw
+
+                sepchars = disp_column_sep
+                if (self.keyCols and col is self.keyCols[-1]) or vcolidx == self.rightVisibleColIndex:
+                    sepchars = disp_keycol_sep
+
                 y = headerRow + numHeaderRows
-                for rowidx in range(0, min(len(rows), self.nVisibleRows)):
+                vd.onMouse(scr, y, x, nrows, colwidth, BUTTON3_RELEASED='edit-cell')
+                celldraws = []  # (y, cellval, attr, sepattr, cellkey) for cells to be drawn, clipped together below
+                for rowidx in range(0, nrows):
                     dispRowIdx = self.topRowIndex + rowidx
-                    if dispRowIdx >= self.nRows:
-                        break
-
                     self.rowLayout[dispRowIdx] = y
 
                     row = rows[rowidx]
-                    cellval = col.getCell(row, colwidth-1)
+                    selection.hint = dispRowIdx
+                    cellval = getCell(row)
                     try:
                         if isNull(cellval.value):
-                            cellval.note = options.disp_note_none
+                            cellval.note = disp_note_none
                             cellval.notecolor = 'color_note_type'
                     except TypeError:
                         pass
 
+                    # the displayed value too, which may come from other sheets (like the source columns of a ColumnsSheet)
+                    cellkey = (id(row), col, col.keycol, col is cursorCol, dispRowIdx == self.cursorRowIndex, self.isSelected(row), sepchars,
+                                cellval.display, getattr(cellval, 'note', None))
+                    if drawnCells.get((y, vcolidx)) == cellkey:
+                        y += 1
+                        continue
+
                     attr = self.colorize(col, row, cellval)
 
                     # sepattr is the attr between cell/columns
@@ -1821,22 +2252,30 @@ class Sheet(BaseSheet):
                         attr = attr.update_attr(color_current_row)
                         sepattr = sepattr.update_attr(color_current_row)
 
+                    celldraws.append((y, cellval, attr, sepattr, cellkey))
+                    y += 1
+
+                # same as clipdraw for each cell, but clipping all plain cells in one batch
+                w = min(colwidth, self.vd.windowWidth-x-1)
+                clipped = clipstrs([disp_column_fill+cellval.display for y, cellval, attr, sepattr, cellkey in celldraws], w)
+                for (y, cellval, attr, sepattr, cellkey), (clippedstr, dispw) in zip(celldraws, clipped):
                     note = getattr(cellval, 'note', None)
                     if note:
                         noteattr = attr.update_attr(colors.get_color(cellval.notecolor), 10)
                         clipdraw(scr, y, x+colwidth-len(note), note, noteattr.attr, len(note))
-
-                    clipdraw(scr, y, x, disp_column_fill+cellval.display, attr.attr, colwidth-(1 if note else 0))
-                    vd.onMouse(scr, y, x, 1, colwidth, BUTTON3_RELEASED='edit-cell')
-
-                    sepchars = disp_column_sep
-                    if (self.keyCols and col is self.keyCols[-1]) or vcolidx == self.rightVisibleColIndex:
-                        sepchars = options.disp_keycol_sep
+                        clipdraw(scr, y, x, disp_column_fill+cellval.display, attr.attr, colwidth-1)
+                    elif w > 0:
+                        with suppress(Exception):
+                            scr.addstr(y, x, disp_column_fill*w, attr.attr)  # clear whole area before displaying
+                            scr.addstr(y, x, clippedstr, attr.attr)
 
                     if x+colwidth+len(sepchars) <= self.vd.windowWidth:
                        scr.addstr(y, x+colwidth, sepchars, sepattr.attr)
 
-                    y += 1
+                    if getattr(cellval, 'notecolor', None) == 'color_note_pending':
+                        drawnCells.pop((y, vcolidx), None)  # keep redrawing until computed
+                    else:
+                        drawnCells[(y, vcolidx)] = cellkey
 
         if vcolidx+1 < self.nVisibleCols:
             scr.addstr(headerRow, self.vd.windowWidth-2, options.disp_more_right, colors.color_column_sep)
@@ -1919,7 +2358,7 @@ Sheet.addCommand('g"', 'dup-rows', 'vs = copy(sheet); vs.name += "_copy"; vs.row
 Sheet.addCommand('z"', 'dup-selected-deep', 'vs = deepcopy(sheet); vs.name += "_selecteddeepcopy"; vs.rows = async_deepcopy(vs, selectedRows or rows); vd.push(vs); status("pushed sheet with async deepcopy of selected rows")'),
 Sheet.addCommand('gz"', 'dup-rows-deep', 'vs = deepcopy(sheet); vs.name += "_deepcopy"; vs.rows = async_deepcopy(vs, rows); vd.push(vs); status("pushed sheet with async deepcopy of all rows")'),
 
-Sheet.addCommand('=', 'addcol-expr', 'addColumn(ColumnExpr(inputExpr("new column expr=")), index=cursorColIndex+1)'),
+Sheet.addCommand('=', 'addcol-expr', 'c=addColumn(ColumnExpr(inputExpr("new column expr=")), index=cursorColIndex+1); c.materializable() and c.materialize()'),
 Sheet.addCommand('g=', 'setcol-expr', 'cursorCol.setValuesFromExpr(selectedRows or rows, inputExpr("set selected="))'),
 
 Sheet.addCommand('V', 'view-cell', 'vd.push(TextSheet("%s[%s].%s" % (name, cursorRowIndex, cursorCol.name), cursorDisplay.splitlines()))'),
@@ -2024,9 +2463,176 @@ def wrapply(func, *args, **kwargs):
         return TypedExceptionWrapper(func, *args, exception=e)
 
 
+class RowSelection:
+    'Selected rows of a sheet, as a flag byte per row position.  Kept aligned with sheet.rows by row identity, even if rows are reordered, inserted or deleted directly.'
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.flags = bytearray()  # [rowidx] -> 1 if .rows[rowidx] is selected
+        self.rows = []            # copy of sheet.rows that .flags is aligned with
+        self.count = 0            # number of 1s in .flags
+        self.hint = 0             # rowidx to look at first for the next row
+
+    def sync(self, sheetrows):
+        'Realign .flags with sheetrows, if those changed since the last sync (by identity: equal rows may have been swapped).  Return .flags.'
+        n = len(self.rows)
+        if not self.count:
+            self.rows = list(sheetrows)
+            self.flags = bytearray(len(sheetrows))
+            return self.flags
+
+        if n <= len(sheetrows) and all(map(operator.is_, self.rows, sheetrows)):  # at most some rows appended
+            self.rows.extend(sheetrows[n:])
+            self.flags.extend(bytes(len(sheetrows)-n))
+        else:  # remap selection by row identity
+            selectedIds = set(map(id, itertools.compress(self.rows, self.flags)))
+            self.rows = list(sheetrows)
+            self.flags = bytearray(map(selectedIds.__contains__, map(id, self.rows)))
+            self.count = self.flags.count(1)
+
+        return self.flags
+
+    def syncRange(self, sheetrows, start, end):
+        'Sync if sheetrows[start:end] are not where they were at the last sync.'
+        if self.count:
+            synced, current = self.rows[start:end], sheetrows[start:end]
+            if len(synced) == len(current) and all(map(operator.is_, synced, current)):
+                return
+            self.sync(sheetrows)
+
+    def index(self, row, guess=None):
+        'Return index of row in .rows, or None.  O(1) if row is at the guess or at/after the last one found; O(nRows) otherwise.'
+        rows = self.rows
+        for i in (self.hint, self.hint+1, guess):
+            if i is not None and 0 <= i < len(rows) and rows[i] is row:
+                self.hint = i
+                return i
+
+        for i in itertools.compress(itertools.count(), map(operator.is_, rows, itertools.repeat(row))):
+            self.hint = i
+            return i
+
+    def isSelected(self, row, guess=None):
+        if not self.count:
+            return False
+        i = self.index(row, guess)
+        return i is not None and self.flags[i] == 1
+
+    def set(self, sheetrows, row, v, guess=None):
+        'Set selection flag of row to v (0 or 1).  Return True if it was selected.'
+        i = self.index(row, guess)
+        if i is None:  # maybe a new row
+            self.sync(sheetrows)
+            i = self.index(row, guess)
+            if i is None:
+                return False
+
+        prev = self.flags[i]
+        self.flags[i] = v
+        self.count += v - prev
+        return prev == 1
+
+    def setRows(self, sheetrows, rows, op):
+        'Set flags to op(flags, 1 for each of rows) all at once, with op one of operator.or_/operator.xor or a&~b.'
+        flags = self.sync(sheetrows)
+        if rows is sheetrows:
+            mask = b'\x01'*len(flags)
+        else:
+            ids = set(map(id, rows))
+            mask = bytes(map(ids.__contains__, map(id, self.rows)))
+        r = op(int.from_bytes(flags, 'little'), int.from_bytes(mask, 'little'))
+        self.flags = bytearray(r.to_bytes(len(flags), 'little'))
+        self.count = self.flags.count(1)
+
+
+# [name] -> numpy function giving the same result as the math function or builtin of one numeric argument
+_numpyFuncs = {
+    'abs': 'abs', 'fabs': 'fabs', 'sqrt': 'sqrt',
+    'exp': 'exp', 'expm1': 'expm1', 'log': 'log', 'log10': 'log10', 'log2': 'log2', 'log1p': 'log1p',
+    'sin': 'sin', 'cos': 'cos', 'tan': 'tan', 'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan',
+    'sinh': 'sinh', 'cosh': 'cosh', 'tanh': 'tanh',
+}
+
+def numpyValues(col, rows):
+    'Return numpy float64 array of the typed values of col for rows.  Raise ValueError if any is not an int or float exactly representable as float64.'
+    import numpy
+    buf = col._typedBuffer
+    if buf and buf.valid() and buf.rows is rows and isinstance(buf.values, array.array) and not buf.mask.count(1):
+        hasints = buf.values.typecode == 'q'
+        ret = numpy.frombuffer(buf.values, dtype=numpy.int64 if hasints else numpy.float64).astype(numpy.float64)
+    else:
+        values = [col.getTypedValue(r) for r in rows]
+        types = set(map(type, values))
+        if not types <= {int, float}:
+            raise ValueError('not all numbers')
+        hasints = int in types
+        ret = numpy.array(values, dtype=numpy.float64)
+
+    if hasints and len(ret) and numpy.abs(ret).max() >= 2**53:
+        raise ValueError('int too large for float64')
+    return ret
+
+
+class TypedBuffer:
+    'Typed values of all rows of a column, converted once by Column.materialize().'
+    def __init__(self, col):
+        sheet = col.sheet
+        self.sheet = sheet
+        self.version = self.sheetVersion()  # before converting, in case rows change meanwhile
+        self.rows = sheet.rows
+        self.hint = 0         # next rowidx expected, for sequential access
+        self.rowidxs = None   # [id(row)] -> rowidx, made on first non-sequential access
+
+        code = materializedTypes.get(col.type)
+        pytype = {'d': float, 'q': int}.get(code)
+        self.values = array.array(code) if code else []
+        self.mask = bytearray()  # [rowidx] -> 1 if not in .values (null, error, or unrepresentable); get those the slow way
+
+        t = col.type
+        getValue = col.getValue
+        calculated = col.calcValues(self.rows)  # all at once, if the column can
+        for i, r in enumerate(Progress(self.rows, 'materializing')):
+            try:
+                v = getValue(r) if calculated is None else calculated[i]
+                if v is None or isinstance(v, (TypedWrapper, Exception)):
+                    raise ValueError(v)
+                v = t(v)
+                if isinstance(v, TypedWrapper) or (pytype and type(v) is not pytype):
+                    raise ValueError(v)
+                self.values.append(v)
+                self.mask.append(0)
+            except Exception:  # includes OverflowError from array
+                self.values.append(0 if code else None)
+                self.mask.append(1)
+
+    def sheetVersion(self):
+        'Anything the column values depend on.'
+        return (self.sheet.epoch, id(self.sheet.rows), len(self.sheet.rows))
+
+    def valid(self):
+        return self.version == self.sheetVersion()
+
+    def rowidx(self, row):
+        'Return index of row in .values, or None if row is not there or its value is masked.'
+        rows = self.rows
+        i = self.hint
+        if i >= len(rows) or rows[i] is not row:
+            if self.rowidxs is None:
+                self.rowidxs = {id(r): i for i, r in enumerate(rows)}
+            i = self.rowidxs.get(id(row))
+            if i is None:
+                return None
+        self.hint = i+1
+        if self.mask[i]:
+            return None
+        return i
+
+
 class Column:
     def __init__(self, name='', *, type=anytype, cache=False, **kwargs):
         self.sheet = None     # owning Sheet, set in Sheet.addColumn
+        self.epoch = 0        # incremented whenever values, type or format change
         self.name = name      # display visible name
         self.fmtstr = ''      # by default, use str()
         self.type = type      # anytype/str/int/float/date/func
@@ -2037,6 +2643,7 @@ class Column:
         self.expr = None      # Column-type-dependent parameter
 
         self._cachedValues = collections.OrderedDict() if cache else None
+        self._typedBuffer = None  # from materialize()
         for k, v in kwargs.items():
             setattr(self, k, v)  # instead of __dict__.update(kwargs) to invoke property.setters
 
@@ -2045,6 +2652,7 @@ class Column:
         ret = cls.__new__(cls)
         ret.__dict__.update(self.__dict__)
         ret.keycol = False   # column copies lose their key status
+        ret._typedBuffer = None
         if self._cachedValues is not None:
             ret._cachedValues = collections.OrderedDict()  # an unrelated cache for copied columns
         return ret
@@ -2059,6 +2667,22 @@ class Column:
         if sheet:
             self.sheet = sheet
         self.name = self._name
+        self.bumpEpoch()
+
+    def bumpEpoch(self):
+        'Invalidate anything derived from the values of this column (and so the rows of its sheet).'
+        self.epoch += 1
+        if self.sheet:
+            self.sheet.bumpEpoch()
+
+    @property
+    def type(self):
+        return self._type
+
+    @type.setter
+    def type(self, t):
+        self._type = t
+        self.bumpEpoch()
 
     @property
     def name(self):
@@ -2071,6 +2695,7 @@ class Column:
         if options.force_valid_colnames:
             name = clean_to_id(name)
         self._name = name
+        self.bumpEpoch()  # expressions refer to columns by name
 
     @property
     def fmtstr(self):
@@ -2079,6 +2704,7 @@ class Column:
     @fmtstr.setter
     def fmtstr(self, v):
         self._fmtstr = v
+        self.bumpEpoch()
 
     def format(self, typedval):
         'Return displayable string of `typedval` according to `Column.fmtstr`'
@@ -2126,18 +2752,47 @@ class Column:
     def calcValue(self, row):
         return (self.getter)(self, row)
 
+    @asyncthread
+    def materialize(self):
+        'Convert the values of all rows to this column\'s type once, for getTypedValue() to read until the column or its rows change.'
+        self._typedBuffer = None
+        if self.sheet and self.materializable():
+            self._typedBuffer = TypedBuffer(self)
+
+    def materializable(self):
+        return self.type in materializedTypes
+
+    def calcValues(self, rows):
+        'Return list of calcValue() for each of rows computed at once, or None to call calcValue() per row.'
+        return None
+
+    def getMaterializedValue(self, row):
+        'Return typed value of row from the materialize() buffer, or None if not there.'
+        buf = self._typedBuffer
+        if buf:
+            if not buf.valid():
+                self._typedBuffer = None
+                return None
+            i = buf.rowidx(row)
+            if i is not None:
+                return buf.values[i]
+
     def getTypedValue(self, row):
         'Returns the properly-typed value for the given row at this column.'
+        if self._typedBuffer:
+            v = self.getMaterializedValue(row)
+            if v is not None:
+                return v
         return wrapply(self.type, wrapply(self.getValue, row))
 
     def getTypedValueOrException(self, row):
         'Returns the properly-typed value for the given row at this column, or an Exception object.'
-        return wrapply(self.type, wrapply(self.getValue, row))
+        return self.getTypedValue(row)
 
     def getTypedValueNoExceptions(self, row):
         '''Returns the properly-typed value for the given row at this column.
            Returns the type's default value if either the getter or the type conversion fails.'''
-        return wrapply(self.type, wrapply(self.getValue, row))
+        return self.getTypedValue(row)
 
     def getValue(self, row):
         'Memoize calcValue with key id(row)'
@@ -2219,6 +2874,38 @@ class Column:
 
         return dw
 
+    def getCellRenderer(self, width=None):
+        '''Return func(row) -> DisplayWrapper, equivalent to getCell(row, width), for drawing many cells of this column.
+           Type, formatter, fmtstr and justification are looked up once; plain str/int/float values skip the wrapply/TypedWrapper round trip.  Anything else falls back to getCell.'''
+        getCell = self.getCell
+        slowpath = lambda row,width=width,getCell=getCell: getCell(row, width)
+
+        typetype = self.type
+        if type(self).getCell is not Column.getCell or typetype not in _fastCellTypes:
+            return slowpath
+
+        rawtypes = _fastCellTypes[typetype]
+        formatter = getType(typetype).formatter
+        fmtstr = self.fmtstr
+        rjust = width-1 if width and isNumeric(self) else 0
+        getValue = self.getValue
+
+        def _renderCell(row):
+            try:
+                cellval = getValue(row)
+                if type(cellval) not in rawtypes:
+                    return getCell(row, width)
+                typedval = cellval if typetype is anytype else typetype(cellval)
+                if type(typedval) not in rawtypes:
+                    return getCell(row, width)
+                s = formatter(fmtstr, typedval)
+            except Exception:
+                return getCell(row, width)  # let the slow path wrap the error
+
+            return DisplayWrapper(cellval, display=s.rjust(rjust) if rjust else (s or ''))
+
+        return _renderCell
+
     def getDisplayValue(self, row):
         return self.getCell(row).display
 
@@ -2249,9 +2936,10 @@ class Column:
 
     @asyncthread
     def setValuesFromExpr(self, rows, expr):
-        compiledExpr = compile(expr, '<expr>', 'eval')
-        for row in Progress(rows, 'setting'):
-            self.setValueSafe(row, self.sheet.evalexpr(compiledExpr, row))
+        values = self.sheet.evalexprVector(expr, rows)
+        evalrow = self.sheet.compileExpr(expr)
+        for i, row in enumerate(Progress(rows, 'setting')):
+            self.setValueSafe(row, evalrow(row) if values is None else values[i])
         self.recalc()
         status('set %d values = %s' % (len(rows), expr))
 
@@ -2382,21 +3070,22 @@ class LazyMapRow:
     def __init__(self, sheet, row):
         self.row = row
         self.sheet = sheet
-        self._keys = [c.name for c in self.sheet.columns]
+        self._cols = {}  # [name] -> first column with that name
+        for c in self.sheet.columns:
+            self._cols.setdefault(c.name, c)
 
     def keys(self):
-        return self._keys
+        return list(self._cols.keys())
 
     def __getitem__(self, colid):
-        try:
-            i = self._keys.index(colid)
-            return self.sheet.columns[i].getTypedValue(self.row)
-        except ValueError:
-            if colid in ['row', '__row__']:
-                return self.row
-            elif colid in ['sheet', '__sheet__']:
-                return self.sheet
-            raise KeyError(colid)
+        c = self._cols.get(colid)
+        if c is not None:
+            return c.getTypedValue(self.row)
+        if colid in ['row', '__row__']:
+            return self.row
+        elif colid in ['sheet', '__sheet__']:
+            return self.sheet
+        raise KeyError(colid)
 
 
 class ColumnExpr(Column):
@@ -2405,8 +3094,19 @@ class ColumnExpr(Column):
         self.expr = expr or name
 
     def calcValue(self, row):
+        if self._typedBuffer:
+            v = self.getMaterializedValue(row)
+            if v is not None:
+                return v
         return self.sheet.evalexpr(self.compiledExpr, row)
 
+    def calcValues(self, rows):
+        return self.sheet.evalexprVector(self.expr, rows)
+
+    def materializable(self):
+        'Also materialize expressions of any type that numpy can evaluate over all rows at once.'
+        return self.type in materializedTypes or bool(self.sheet and self.sheet.vectorizeExpr(self.expr))
+
     @property
     def expr(self):
         return self._expr
@@ -2415,6 +3115,7 @@ class ColumnExpr(Column):
     def expr(self, expr):
         self._expr = expr
         self.compiledExpr = compile(expr, '<expr>', 'eval') if expr else None
+        self.bumpEpoch()
 
 ###
 
@@ -2426,17 +3127,33 @@ def confirm(prompt):
 
 
 import unicodedata
-@functools.lru_cache(maxsize=8192)
-def clipstr(s, dispw):
-    '''Return clipped string and width in terminal display characters.
 
-    Note: width may differ from len(s) if East Asian chars are 'fullwidth'.'''
+_clipcache = {}   # [(s, dispw)] -> (clipped, dispw); cleared when full or when options change
+_clipcache_max = 8192
+_clipopts = [None]  # options._epoch, disp_oddspace, disp_truncator, disp_ambig_width as of _clipcache
+
+_isascii = getattr(str, 'isascii', None) or (lambda s: all(ord(c) < 128 for c in s))  # str.isascii new in 3.7
+
+def _clipoptions():
+    'Return (disp_oddspace, disp_truncator, disp_ambig_width), clearing the clipstr cache if they may have changed.'
+    if _clipopts[0] != options._epoch:
+        _clipcache.clear()
+        _clipopts[:] = [options._epoch, options.disp_oddspace, options.disp_truncator, options.disp_ambig_width]
+    return _clipopts[1:]
+
+def _clipstr(s, dispw, oddspace, truncator, ambig_width):
+    if s.isprintable() and _isascii(s):  # every char is 1 wide
+        maxw = dispw-len(truncator)+1
+        if len(s) <= max(maxw, 0):
+            return s, len(s)
+        w = max(maxw+1, 1)  # width when truncated in the slow path below
+        return s[:w][:-2] + truncator, w+len(truncator)
+
     w = 0
     ret = ''
-    ambig_width = options.disp_ambig_width
     for c in s:
         if c != ' ' and unicodedata.category(c) in ('Cc', 'Zs', 'Zl'):  # control char, space, line sep
-            c = options.disp_oddspace
+            c = oddspace
 
         if c:
             c = c[0]  # multi-char disp_oddspace just uses the first char
@@ -2449,13 +3166,34 @@ def clipstr(s, dispw):
             elif not unicodedata.combining(c):
                 w += 1
 
-        if w > dispw-len(options.disp_truncator)+1:
-            ret = ret[:-2] + options.disp_truncator  # replace final char with ellipsis
-            w += len(options.disp_truncator)
+        if w > dispw-len(truncator)+1:
+            ret = ret[:-2] + truncator  # replace final char with ellipsis
+            w += len(truncator)
             break
 
     return ret, w
 
+def clipstr(s, dispw):
+    '''Return clipped string and width in terminal display characters.
+
+    Note: width may differ from len(s) if East Asian chars are 'fullwidth'.'''
+    return clipstrs([s], dispw)[0]
+
+def clipstrs(strs, dispw):
+    'Return list of clipstr(s, dispw) for each s in strs; for clipping many strings (like a column of cells) to the same width.'
+    opts = _clipoptions()
+    if len(_clipcache) > _clipcache_max:
+        _clipcache.clear()
+
+    ret = []
+    for s in strs:
+        k = (s, dispw)
+        r = _clipcache.get(k)
+        if r is None:
+            r = _clipcache[k] = _clipstr(s, dispw, *opts)
+        ret.append(r)
+    return ret
+
 
 ## text viewer and dir browser
 # rowdef: (linenum, str)